@@ -1,6 +1,169 @@
-from ydata_profiling import ProfileReport
+import html
+import json
+import os
+import re
 
-def generate_eda(df, output_path = "eda_report.html"):
-    profile = ProfileReport(df, title = "Auto EDA Report", explorative = True)
-    profile.to_file(output_path)
-    return output_path
\ No newline at end of file
+import numpy as np
+
+from artifact_store import ARTIFACT_DIR, VIEWER_SCRIPT, ArtifactStore, write_file
+from instrumentation import instrumented, span
+from lazy_imports import LazyModule
+
+# ydata_profiling takes seconds to import; only report generation needs it
+profiling = LazyModule("ydata_profiling")
+
+REPORT_DIR = ARTIFACT_DIR
+DEFAULT_ROW_BUDGET = 100_000
+SECTIONS_FILE = "sections.json"
+
+EDA_MODES = {
+    "minimal": "Minimal (sampled, no interactions or correlations)",
+    "sampled": "Explorative on a sample",
+    "full": "Full explorative (all rows)",
+}
+
+
+def sample_rows(df, row_budget, stratify_by=None, random_state=0):
+    if not row_budget or len(df) <= row_budget:
+        return df
+
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(len(df))
+    if stratify_by is None:
+        return df.iloc[np.sort(order[:row_budget])].copy()
+
+    # proportional quota per stratum (at least one row each), filled from a
+    # random permutation so the pick within each stratum is uniform
+    codes = df[stratify_by].factorize(use_na_sentinel=False)[0][order]
+    sizes = np.bincount(codes)
+    quota = np.maximum(1, np.round(sizes * row_budget / len(df))).astype(np.int64)
+    rank = np.zeros(len(codes), dtype=np.int64)
+    sorted_codes = np.argsort(codes, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank[sorted_codes] = np.arange(len(codes)) - np.repeat(starts, sizes)
+    return df.iloc[np.sort(order[rank < quota[codes]])].copy()
+
+
+def stratification_columns(df, max_groups=50, stats=None, source=None):
+    # source is what stats summarizes when df is a sample of it (the
+    # dataset's table in an out-of-core engine)
+    candidates = df.select_dtypes(include=["object", "category", "string", "bool"]).columns
+    if stats is not None:
+        # distinct-count sketches rule out high-cardinality columns cheaply;
+        # the exact count only runs for the few that could qualify
+        column_stats = stats.get(df if source is None else source, candidates, distinct=True)
+        candidates = [col for col in candidates if column_stats[col].distinct_count() <= 2 * max_groups]
+    return [col for col in candidates if df[col].nunique(dropna=False) <= max_groups]
+
+
+def eda_settings(mode="minimal", row_budget=DEFAULT_ROW_BUDGET, stratify_by=None):
+    if mode == "full":
+        return {"mode": mode, "row_budget": None, "stratify_by": None}
+    return {"mode": mode, "row_budget": int(row_budget), "stratify_by": stratify_by}
+
+
+def report_path(dataset_hash, settings, report_dir=REPORT_DIR):
+    # the full report of a dataset and settings; its section pages sit next to it
+    return ArtifactStore(report_dir).path(dataset_hash, "eda", settings, "report.html")
+
+
+@instrumented("generate_eda", tags=("mode", "row_budget", "stratify_by"))
+def generate_eda(df, output_path, mode="full", row_budget=None, stratify_by=None, progress=None):
+    progress = progress or (lambda fraction, message="": None)
+    progress(0.05, "Sampling rows")
+    data = df if mode == "full" else sample_rows(df, row_budget, stratify_by)
+    title = "Auto EDA Report"
+    if len(data) < len(df):
+        title += f" ({len(data):,} of {len(df):,} rows sampled)"
+
+    progress(0.15, "Profiling")
+    if mode == "minimal":
+        profile = profiling.ProfileReport(data, title = title, minimal = True)
+    else:
+        profile = profiling.ProfileReport(data, title = title, explorative = True)
+
+    with span("eda_profile", sampled_rows=len(data)):
+        profile.get_description()
+    progress(0.7, "Rendering report")
+    with span("eda_render"):
+        report = profile.to_html()
+
+    progress(0.95, "Writing report")
+    with span("eda_write"):
+        write_report(report, output_path)
+    return output_path
+
+
+# section headings as recent (first) and older (second) ydata-profiling releases write them
+_SECTION_HEADERS = (
+    re.compile(r'<div id="?([\w-]+)"? class="?section-header"?><h1 class="?section-name"?>(.*?)</h1>', re.S),
+    re.compile(r'<div class="row header"><a class="?anchor-pos"? id="?([\w-]+)"?></a>'
+               r'<h1 class="?page-header"?>(.*?)</h1>', re.S),
+)
+_STYLE = re.compile(r"<style[^>]*>(.*?)</style>", re.S)
+_SCRIPT = re.compile(r"<script[^>]*>(.*?)</script>", re.S)
+
+
+def split_report(report):
+    # A ydata-profiling page cut into its parts: the head without its style
+    # sheets, the style sheets and the trailing scripts (shared by every
+    # section, so the browser caches them once), the markup opening the
+    # content, one (id, title, markup) per section and the footer. None when
+    # the page does not have the expected layout.
+    head = re.search(r"<head>(.*?)</head>", report, re.S)
+    body = re.search(r"<body>(.*)</body>", report, re.S)
+    if head is None or body is None:
+        return None
+    body = body.group(1)
+    content = re.search(r'<div class="?content"?>', body)
+    headers = next((found for found in (list(pattern.finditer(body)) for pattern in _SECTION_HEADERS)
+                    if found), [])
+    footer = body.find("<footer>")
+    if content is None or not headers or footer < headers[-1].start():
+        return None
+    tail = body[footer:]
+    bounds = [header.start() for header in headers] + [footer]
+    return {
+        "head": _STYLE.sub("", head.group(1)),
+        "css": "\n".join(_STYLE.findall(head.group(1))),
+        "js": "\n".join(_SCRIPT.findall(tail)),
+        "opening": body[content.start():headers[0].start()],
+        "sections": [(header.group(1), html.unescape(header.group(2)), body[start:stop])
+                     for header, start, stop in zip(headers, bounds[:-1], bounds[1:])],
+        "footer": _SCRIPT.sub("", tail),
+    }
+
+
+def write_report(report, output_path):
+    # Writes the full report plus one page per section next to it, and the
+    # section index the app shows them from (see report_sections). Every
+    # page carries the artifact viewer's script. The full report is written
+    # last: once it exists, so does everything else.
+    directory = os.path.dirname(output_path)
+    name = os.path.basename(output_path)
+    parts = split_report(report)
+    sections = []
+    if parts is not None:
+        write_file(os.path.join(directory, "report.css"), parts["css"])
+        write_file(os.path.join(directory, "report.js"), parts["js"])
+        closing = "</div>" * (parts["opening"].count("<div") - parts["opening"].count("</div"))
+        for section_id, title, markup in parts["sections"]:
+            page = f"section-{section_id}.html"
+            write_file(os.path.join(directory, page), (
+                f"<!doctype html><html lang=en><head>{parts['head']}<link rel=stylesheet href=report.css>"
+                f"</head><body><p class=\"text-end small m-2\"><a href=\"{name}\" download=eda_report.html>"
+                f"Download full report</a></p>{parts['opening']}{markup}{closing}{parts['footer']}"
+                f"<script src=report.js></script>{VIEWER_SCRIPT}</body></html>"
+            ))
+            sections.append({"title": title, "file": page})
+    sections.append({"title": "Full report", "file": name})
+    write_file(os.path.join(directory, SECTIONS_FILE), json.dumps(sections))
+    write_file(output_path, report.replace("</body>", f"{VIEWER_SCRIPT}</body>", 1))
+    return output_path
+
+
+def report_sections(output_path):
+    # [(title, path)] of a written report's pages, in report order
+    directory = os.path.dirname(output_path)
+    with open(os.path.join(directory, SECTIONS_FILE), encoding="utf-8") as f:
+        return [(section["title"], os.path.join(directory, section["file"])) for section in json.load(f)]
@@ -1,49 +1,115 @@
 import io
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import streamlit as st
 from typing import List
 
-@st.cache_data(ttl=3600, show_spinner="Generating quick insights...")
-def quick_insights(df: pd.DataFrame, eda_options: List[str]):
-    insights = {}
+from column_stats import ColumnStatsStore, get_column_stats, select_columns
+from dataset_cache import get_registry
+from instrumentation import instrumented
+from lazy_imports import LazyModule
+from job_runner import get_runner, poll_job, stored_frame
+from sketches import row_fingerprints
 
-    if "Shape of Dataset" in eda_options:
-        insights["Shape of Dataset"] = df.shape
+px = LazyModule("plotly.express")
 
-    if "Sample Data" in eda_options:
-        insights["Sample Data"] = df.sample(5)
+NULL_PATTERN_BUCKETS = 100    # row buckets in the null pattern view
+TOP_NULL_PATTERNS = 10
 
-    if "Info" in eda_options:
-        buf = io.StringIO()
-        df.info(buf=buf)
-        insights["Info"] = buf.getvalue()
-
-    if "Describe" in eda_options:
-        insights["Describe"] = df.describe()
-
-    if "Null Values Count" in eda_options:
-        insights["Null Values Count"] = df.isnull().sum()
-
-    if "Numerical Columns" in eda_options:
-        insights["Numerical Columns"] = df.select_dtypes(include=['number']).columns.tolist()
+@instrumented("quick_insight", tags=("option",))
+def quick_insight(df: pd.DataFrame, option: str, stats: ColumnStatsStore = None,
+                  workers: int = 1, backend: str = "thread"):
+    # df may also be a compute_engine.DuckDBTable, which answers each
+    # option from queries over its file
+    stats = stats if stats is not None else ColumnStatsStore()
 
-    if "Categorical Columns" in eda_options:
-        insights["Categorical Columns"] = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    if option == "Shape of Dataset":
+        return df.shape
 
-    return insights
+    if option == "Sample Data":
+        return df.sample(5)
 
-
-def generate_null_heatmap(df: pd.DataFrame):
-    fig, ax = plt.subplots(figsize=(6,4))
-    sns.heatmap(df.isnull(), cbar=False, cmap="viridis", ax=ax)
-    ax.set_title("Null Values Heatmap")
+    if option == "Info":
+        buf = io.StringIO()
+        df.info(buf=buf)
+        return buf.getvalue()
+
+    if option == "Describe":
+        return stats.describe(df, workers, backend)
+
+    if option == "Null Values Count":
+        return stats.null_counts(df, workers, backend)
+
+    if option == "Numerical Columns":
+        return select_columns(df, ['number'])
+
+    if option == "Categorical Columns":
+        return select_columns(df, ['object', 'category', 'string'])
+
+    raise ValueError(f"Unknown EDA operation: {option}")
+
+
+@instrumented("quick_insights")
+def quick_insights(df: pd.DataFrame, eda_options: List[str], stats: ColumnStatsStore = None,
+                   workers: int = 1, backend: str = "thread"):
+    stats = stats if stats is not None else ColumnStatsStore()
+    return {option: quick_insight(df, option, stats, workers, backend) for option in eda_options}
+
+
+def null_pattern_summary(df: pd.DataFrame, n_buckets: int = NULL_PATTERN_BUCKETS,
+                         top_patterns: int = TOP_NULL_PATTERNS):
+    # Null fraction per (row bucket, column) and the most frequent sets of
+    # columns that are missing together. The output size depends only on the
+    # bucket and column counts, never on the number of rows.
+    mask = df.isna().to_numpy()
+    n_rows = mask.shape[0]
+    n_buckets = max(1, min(n_buckets, n_rows))
+    starts = (np.arange(n_buckets) * n_rows) // n_buckets
+    sizes = np.diff(np.append(starts, n_rows))
+    fractions = np.add.reduceat(mask, starts, axis=0, dtype=np.int64) / sizes[:, None]
+    labels = [f"{start + 1}-{start + size}" for start, size in zip(starts, sizes)]
+
+    null_columns = df.columns[mask.any(axis=0)]
+    if len(null_columns):
+        patterns = row_fingerprints(pd.DataFrame(mask[:, mask.any(axis=0)]))
+        codes = pd.factorize(patterns)[0]
+        counts = np.bincount(codes)
+        # factorize numbers patterns in order of first appearance
+        first_rows = np.flatnonzero(np.diff(np.maximum.accumulate(codes), prepend=-1) > 0)
+        top = np.argsort(-counts, kind="stable")[:top_patterns]
+        missing = [
+            ", ".join(null_columns[mask[first_rows[code]][mask.any(axis=0)]]) or "(no nulls)"
+            for code in top
+        ]
+        rows = counts[top]
+    else:
+        missing, rows = ["(no nulls)"], np.array([n_rows])
+
+    return {
+        "fractions": pd.DataFrame(fractions, index=labels, columns=df.columns),
+        "patterns": pd.DataFrame({
+            "Missing columns": missing,
+            "Rows": rows,
+            "Share": rows / max(1, n_rows),
+        }),
+    }
+
+
+def generate_null_heatmap(summary):
+    fig = px.imshow(
+        summary["fractions"], aspect="auto", zmin=0, zmax=1,
+        color_continuous_scale="viridis",
+        labels={"x": "Column", "y": "Rows", "color": "Null fraction"},
+        title="Null Values Heatmap"
+    )
+    fig.update_layout(height=400, margin=dict(l=20, r=20, t=40, b=20))
     return fig
 
 
-def display_insights():
+def display_insights(statistics="exact", workers=1, backend="thread", table=None):
+    # table is the dataset in an out-of-core engine; the insights are then
+    # computed over the file instead of the session's frame
+    import streamlit as st
+
     st.header("🔎 Manual EDA Explorer")
 
     if 'df' not in st.session_state:
@@ -71,7 +137,21 @@ def display_insights():
             st.warning("Please select at least one EDA operation!")
         else:
             st.session_state.eda_options = eda_options
-            st.session_state.eda_results = quick_insights(df, eda_options)
+            with st.spinner("Generating quick insights..."):
+                # cached per operation, so adding one to the selection only
+                # computes that one; all of them read the shared column stats
+                registry = get_registry()
+                stats = get_column_stats(st.session_state.file_hash, statistics)
+                st.session_state.eda_results = {}
+                for option in eda_options:
+                    params = {"option": option}
+                    if option == "Describe":
+                        params["statistics"] = statistics
+                    st.session_state.eda_results[option] = registry.cached(
+                        st.session_state.file_hash, "quick_insight", params,
+                        quick_insight, df if table is None else table, option, stats, workers, backend
+                    )
+                st.session_state.eda_notes = stats.error_notes()
 
    
     if st.session_state.eda_results:
@@ -87,11 +167,31 @@ def display_insights():
                 st.text(result)
             elif option == "Describe":
                 st.write(result)
+                for note in st.session_state.get("eda_notes", []):
+                    st.caption(f"≈ {note}")
             elif option == "Null Values Count":
                 st.write(result)
                 if st.checkbox("Show Null Values Heatmap", key="nullmap"):
-                    fig = generate_null_heatmap(df)
-                    st.pyplot(fig)
+                    registry = get_registry()
+                    summary = registry.get_result(st.session_state.file_hash, "null_patterns")
+                    if summary is None:
+                        # computed in a worker; resubmitting on rerun joins the same job
+                        job_id = get_runner().submit(
+                            st.session_state.file_hash, "null_patterns", {}, null_pattern_summary,
+                            stored_frame(st.session_state.file_hash, df)
+                        )
+                        status = poll_job(job_id, "Summarizing null patterns")
+                        if status["state"] == "done":
+                            summary = get_runner().result(job_id)
+                            registry.put_result(st.session_state.file_hash, "null_patterns", {}, summary)
+                        elif status["error"] is not None:
+                            st.error(f"❌ Null pattern summary failed: {status['error']}")
+                    if summary is not None:
+                        if table is not None:
+                            st.caption(f"Null patterns of the {len(df):,}-row sample of the file")
+                        st.plotly_chart(generate_null_heatmap(summary), use_container_width=True)
+                        st.write("Most frequent null patterns")
+                        st.dataframe(summary["patterns"], hide_index=True)
             elif option == "numerical_columns":
                 st.write("### 🔹 Numerical Columns")
                 st.write(result)
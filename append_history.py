@@ -0,0 +1,174 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from column_stats import ColumnStatsStore, approximate_column_stats, get_column_stats, is_numeric
+from data_quality_score import calculate_score
+from dataset_cache import estimate_size, get_registry
+from file_handler import downcast_float
+from instrumentation import instrumented
+from sketches import FingerprintSet, fingerprint_collision_bound, row_fingerprints
+
+
+def appended_hash(dataset_hash, chunk_hash):
+    # the same chunk appended to the same dataset always gets the same key,
+    # so sessions appending identical extracts share the result
+    return hashlib.md5(f"{dataset_hash}+{chunk_hash}".encode()).hexdigest()
+
+
+def append_frames(df, chunk):
+    # The combined frame is a new contiguous frame: building it copies every
+    # row, O(total rows), in one vectorized pass. Everything computed from it
+    # (history, statistics, score) is O(new rows); see AppendHistory.
+    if list(chunk.columns) != list(df.columns):
+        missing = [col for col in df.columns if col not in chunk.columns]
+        extra = [col for col in chunk.columns if col not in df.columns]
+        detail = f"missing {missing}, unexpected {extra}" if missing or extra else "columns are in a different order"
+        raise ValueError(f"Appended file does not match the dataset's columns: {detail}")
+    df_dtypes, chunk_dtypes = conform_dtypes(df, chunk)
+    return pd.concat([df.astype(df_dtypes, copy=False), chunk.astype(chunk_dtypes, copy=False)],
+                     ignore_index=True)
+
+
+def conform_dtypes(df, chunk):
+    # The dtypes to cast the dataset and the freshly parsed chunk to before
+    # concatenating, as ({col: dtype}, {col: dtype}), so appending to a
+    # compacted dataset keeps it compact: category columns take the union of
+    # both sides' categories, and downcast numbers keep the narrowest dtype
+    # holding both sides (the dataset's column widens only when the new values
+    # do not fit). Columns with no common dtype of their kind (text appended
+    # to numbers, mismatched category types) are left to concat, as before.
+    df_dtypes, chunk_dtypes = {}, {}
+    for col in df.columns:
+        dtype, values = df[col].dtype, chunk[col]
+        if values.dtype == dtype:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            new = pd.Index(values.dropna().unique()).difference(dtype.categories, sort=False)
+            if len(new) and new.dtype != dtype.categories.dtype:
+                continue
+            if len(new):
+                dtype = pd.CategoricalDtype(dtype.categories.append(new), ordered=dtype.ordered)
+                df_dtypes[col] = dtype
+            chunk_dtypes[col] = dtype
+        elif _plain_number(dtype) and _plain_number(values.dtype):
+            narrow = pd.to_numeric(values, downcast="integer") if values.dtype.kind in "iu" \
+                else downcast_float(values)
+            target = np.promote_types(dtype, narrow.dtype)
+            if target != dtype:
+                df_dtypes[col] = target
+            chunk_dtypes[col] = target
+        elif isinstance(dtype, pd.StringDtype) and pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+            chunk_dtypes[col] = dtype
+    return df_dtypes, chunk_dtypes
+
+
+def _plain_number(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in "iuf"
+
+
+def same_hash_dtypes(a, b):
+    # whether rows hash alike under both Series of dtypes: categorical values
+    # hash like their categories' values, so a category column whose
+    # categories grew still matches
+    def key(dtype):
+        return "category" if isinstance(dtype, pd.CategoricalDtype) else dtype
+    return len(a) == len(b) and all(key(x) == key(y) for x, y in zip(a, b))
+
+
+class AppendHistory:
+    # What the quality score and Quick Insights need about a dataset that
+    # grows by appends, in mergeable form: row fingerprints for duplicates and
+    # sketch-based column statistics (moments, null counts, KLL quartiles and
+    # outlier ranks). Appending summarizes only the new rows and merges them
+    # in. Histories are cached in the registry and never mutated; append
+    # returns a new one.
+    def __init__(self, dtypes, rows, fingerprints, stats):
+        self.dtypes = dtypes            # Series of column dtypes
+        self.rows = rows
+        self.fingerprints = fingerprints
+        self.stats = stats              # ColumnStatsStore in approximate mode
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.fingerprints.__sizeof__() + self.stats.__sizeof__()
+
+    @classmethod
+    def start(cls, df, stats=None, workers=1, backend="thread"):
+        # one full pass over the dataset as first uploaded
+        stats = stats if stats is not None else ColumnStatsStore("approximate")
+        stats.get(df, workers=workers, backend=backend)
+        return cls(df.dtypes, len(df), FingerprintSet(row_fingerprints(df)), stats)
+
+    def duplicates(self):
+        # (count, note) in the form count_duplicates returns
+        return (self.rows - len(self.fingerprints),
+                f"fingerprinted, ≤{fingerprint_collision_bound(self.rows):.1g} expected collisions")
+
+    @instrumented("append_rows")
+    def append(self, combined, workers=1, backend="thread"):
+        # combined is the dataset with the new rows at the end. The new rows
+        # are summarized with the combined dtypes; a column whose dtype
+        # changed kind (numeric <-> not) is summarized again in full, and a
+        # dtype change refreshes the fingerprints, whose hashes depend on the
+        # dtype (categories growing is not a change).
+        new_rows = combined.iloc[self.rows:]
+        delta = ColumnStatsStore("approximate").get(new_rows, workers=workers, backend=backend)
+        columns = {}
+        for col in combined.columns:
+            old = self.stats.columns[col]
+            if is_numeric(old.dtype) != is_numeric(combined[col].dtype):
+                columns[col] = approximate_column_stats(combined, [col])[col]
+                continue
+            merged = old.merge(delta[col])
+            merged.dtype = combined[col].dtype
+            columns[col] = merged
+
+        if same_hash_dtypes(combined.dtypes, self.dtypes):
+            fingerprints = self.fingerprints.union(row_fingerprints(new_rows))
+        else:
+            fingerprints = FingerprintSet(row_fingerprints(combined))
+        stats = ColumnStatsStore("approximate")
+        stats.update(columns)
+        return AppendHistory(combined.dtypes, len(combined), fingerprints, stats)
+
+    def score(self, df, progress=None):
+        # the quality score of the whole dataset without touching its rows
+        return calculate_score(df, "fingerprint", progress, self.stats, known_duplicates=self.duplicates())
+
+
+def get_history(dataset_hash, df, workers=1, backend="thread"):
+    # the dataset's history, started (one full pass) on its first append;
+    # the starting statistics are the dataset's approximate store
+    return get_registry().cached(
+        dataset_hash, "append_history", {}, AppendHistory.start, df,
+        get_column_stats(dataset_hash, "approximate"), workers, backend
+    )
+
+
+def append_rows(dataset_hash, df, chunk, chunk_hash, workers=1, backend="thread"):
+    # Appends a parsed chunk to a registered dataset. Returns the combined
+    # dataset's hash, frame and history. The combined frame, its history and
+    # its approximate column statistics are registered under the new hash,
+    # so later appends, Quick Insights and charts start from them. Raises
+    # ValueError when the chunk's columns differ from the dataset's.
+    registry = get_registry()
+    new_hash = appended_hash(dataset_hash, chunk_hash)
+    combined = registry.get_frame(new_hash)
+    history = registry.get_result(new_hash, "append_history")
+    if combined is not None and history is not None:
+        return new_hash, combined, history
+
+    combined = append_frames(df, chunk)
+    history = get_history(dataset_hash, df, workers, backend).append(combined, workers, backend)
+    # the dataset's size plus the new rows' holds while no column was widened;
+    # otherwise the combined frame is measured again
+    base_size = registry.frame_size(dataset_hash)
+    if base_size is not None and same_hash_dtypes(combined.dtypes, df.dtypes):
+        size = base_size + estimate_size(combined.iloc[len(df):])
+    else:
+        size = None
+    registry.put_frame(new_hash, combined, size)
+    registry.put_result(new_hash, "append_history", {}, history)
+    registry.put_result(new_hash, "column_stats", {"mode": "approximate"}, history.stats)
+    return new_hash, combined, history
@@ -0,0 +1,105 @@
+import contextlib
+import hashlib
+import os
+import tempfile
+
+ARTIFACT_DIR = os.path.join(".cache", "artifacts")
+
+VIEWER_NAME = "artifact_viewer"
+
+FILE_MODE = 0o644                 # written files; temporary files are created private
+
+# Inlined into every page the viewer shows. The page tells the app it is
+# ready and how tall to make its frame, and when the app asks for another
+# page (a rerun with a new path) it navigates there itself, relative to the
+# component's file route; the app's messages only ever carry the path.
+VIEWER_SCRIPT = """<script>
+(function () {
+  if (window.parent === window) return;
+  var marker = "/artifact_store.%s/";
+  var root = location.href.slice(0, location.href.indexOf(marker) + marker.length);
+  function send(type, data) {
+    window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+  }
+  window.addEventListener("message", function (event) {
+    if (!event.data || event.data.type !== "streamlit:render") return;
+    send("streamlit:setFrameHeight", {height: event.data.args.height});
+    var target = new URL(event.data.args.path, root);
+    if (target.pathname !== location.pathname) location.replace(target.href);
+  });
+  send("streamlit:componentReady", {apiVersion: 1});
+})();
+</script>""" % VIEWER_NAME
+
+
+def settings_digest(settings):
+    return hashlib.md5(repr(sorted(settings.items())).encode()).hexdigest()[:12]
+
+
+class ArtifactStore:
+    # Files derived from a dataset, such as EDA reports, kept on disk under
+    # <root>/<kind>/<dataset hash>/<settings digest>/ and shared by every
+    # session and batch run. Sessions only hold paths: the app serves the
+    # tree to the browser itself (see viewer), compressed by Streamlit's
+    # server and revalidated by ETag, so a rerun never resends a file.
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+
+    def directory(self, dataset_hash, kind, settings):
+        return os.path.join(self.root, kind, dataset_hash, settings_digest(settings))
+
+    def path(self, dataset_hash, kind, settings, name):
+        return os.path.join(self.directory(dataset_hash, kind, settings), name)
+
+    def url_path(self, path):
+        # path of a file below the root, as the viewer expects it
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def viewer(self, path, height=800, key=None):
+        # Shows an HTML file of the store in the app. The browser fetches
+        # the page (and the assets it links) straight from disk through the
+        # component's file route; the page must carry VIEWER_SCRIPT.
+        import streamlit.components.v1 as components
+
+        index = os.path.join(self.root, "index.html")
+        if not os.path.exists(index):
+            write_file(index, f"<!doctype html><html><body>{VIEWER_SCRIPT}</body></html>")
+        component = components.declare_component(VIEWER_NAME, path=self.root)
+        return component(path=self.url_path(path), height=height, key=key, default=None)
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    # Yields a temporary path next to `path`, private to this write, and
+    # renames it over `path` once the block finishes, so concurrent readers
+    # never see a half-written file and concurrent writers never share one.
+    # The temporary file is removed if the block raises.
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, partial = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".partial")
+    os.close(descriptor)
+    try:
+        yield partial
+        os.chmod(partial, FILE_MODE)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def write_file(path, content):
+    with atomic_write(path) as partial:
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(content)
+    return path
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
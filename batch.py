@@ -0,0 +1,225 @@
+# Headless batch mode: validates, scores and summarizes every data file in
+# a directory or glob on a process pool, without Streamlit, and streams one
+# JSON record per file as JSON Lines. Files whose content (and settings) were
+# already processed into the output file are skipped, so a nightly run over
+# a drop folder only touches new files:
+#
+#   python batch.py drop/ --output results.jsonl
+#   python batch.py "drop/**/*.csv" --output results.jsonl --eda --workers 8
+#   python batch.py big/ --output results.jsonl --engine duckdb
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from analysis.auto_eda import EDA_MODES, DEFAULT_ROW_BUDGET, REPORT_DIR, eda_settings, generate_eda, report_path
+from analysis.quick_insights import quick_insights
+from column_stats import STATISTICS_MODES, ColumnStatsStore
+from compute_engine import COMPUTE_ENGINES, validate_table
+from data_quality_score import DUPLICATE_MODES, calculate_score
+from file_handler import get_file_hash, is_columnar_file, is_valid_columnar, is_valid_csv
+from instrumentation import get_recorder, run_collecting, set_context
+from lazy_imports import WORKER_WARM_UP_MODULES, warm_up
+from parallel import DEFAULT_WORKERS
+
+EXTENSIONS = (".csv", ".parquet", ".feather")
+INSIGHT_OPTIONS = ["Shape of Dataset", "Info", "Describe", "Null Values Count",
+                   "Numerical Columns", "Categorical Columns"]
+DEFAULT_INSIGHTS = ["Shape of Dataset", "Describe", "Null Values Count",
+                    "Numerical Columns", "Categorical Columns"]
+
+
+def find_files(patterns, recursive=False):
+    # directories are scanned for supported extensions, anything else is a
+    # glob; each file is listed once, in sorted order
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        files += [path for path in glob.glob(pattern, recursive=True)
+                  if os.path.isfile(path) and path.lower().endswith(EXTENSIONS)]
+    return sorted(set(files))
+
+
+def to_json(value):
+    # frames and series go through pandas' encoder, which writes NaN as null
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return json.loads(value.to_json(default_handler=str))
+    if isinstance(value, (tuple, list)):
+        return [to_json(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def processed_keys(output_path):
+    # (dataset_hash, settings) of every record in an existing output file,
+    # except failures, which are retried
+    keys = set()
+    if output_path is None or not os.path.exists(output_path):
+        return keys
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue              # a line cut short by an interrupted run
+            if record.get("status") != "error" and record.get("dataset_hash"):
+                keys.add((record["dataset_hash"], json.dumps(record.get("settings"), sort_keys=True)))
+    return keys
+
+
+def validate_file_table(path, file_hash=None):
+    # is_valid_csv/is_valid_columnar for the DuckDB engine
+    status, message, table = validate_table(path)
+    if not status:
+        return False, message, None, None
+    if file_hash is None:
+        with open(path, "rb") as file:
+            file_hash = get_file_hash(file)
+    return True, message, table, file_hash
+
+
+def analyze_file(path, settings, file_hash=None):
+    # One output record; never raises, so one bad file cannot stop the batch.
+    # file_hash, when known, also identifies files that fail validation.
+    # With the DuckDB engine df is a table scanning the file in place.
+    record = {"path": path, "dataset_hash": file_hash, "settings": settings}
+    start = time.perf_counter()
+    try:
+        if settings["engine"] == "duckdb":
+            status, message, df, parsed_hash = validate_file_table(path, file_hash)
+        else:
+            with open(path, "rb") as file:
+                validate = is_valid_columnar if is_columnar_file(file) else is_valid_csv
+                status, message, df, parsed_hash = validate(file, file_hash=file_hash)
+        record.update(status="ok" if status else "invalid", message=message)
+        if status:
+            file_hash = record["dataset_hash"] = parsed_hash
+            set_context(path=path, dataset_hash=file_hash, rows=df.shape[0], cols=df.shape[1])
+            record.update(rows=df.shape[0], cols=df.shape[1])
+            # one store per file, shared by the score and the insights
+            stats = ColumnStatsStore(settings["statistics"])
+            score, factors = calculate_score(df, settings["duplicate_mode"], stats=stats)
+            record.update(score=to_json(score), factors=factors)
+            insights = quick_insights(df, settings["insights"], stats)
+            record["insights"] = {option: to_json(value) for option, value in insights.items()}
+            record["notes"] = stats.error_notes()
+            if settings["eda"] is not None:
+                output_path = report_path(file_hash, settings["eda"], settings["report_dir"])
+                if not os.path.exists(output_path):
+                    generate_eda(df, output_path, **settings["eda"])
+                record["eda_report"] = output_path
+    except Exception as e:
+        record.update(status="error", message=f"{type(e).__name__}: {e}")
+    record["elapsed_s"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def _run_file(path, settings, file_hash):
+    context = {"path": path, "dataset_hash": file_hash}
+    record, spans = run_collecting(context, analyze_file, path, settings, file_hash)
+    record["timings"] = {}
+    for span in spans:
+        record["timings"][span["name"]] = round(record["timings"].get(span["name"], 0) + span["duration_s"], 4)
+    return record, spans
+
+
+def run_batch(files, settings, output, workers=DEFAULT_WORKERS, skip=()):
+    # Hashes every file first (cheap next to parsing) to skip content seen in
+    # earlier runs or earlier in this one, then analyzes the rest in worker
+    # processes and writes records as they finish. Returns counts per status.
+    counts = {"ok": 0, "invalid": 0, "error": 0, "skipped": 0}
+    settings_key = json.dumps(settings, sort_keys=True)
+    seen = set(skip)
+    pending = []
+    for path in files:
+        with open(path, "rb") as file:
+            key = (get_file_hash(file), settings_key)
+        if key in seen:
+            counts["skipped"] += 1
+            continue
+        seen.add(key)
+        pending.append((path, key[0]))
+
+    if not pending:
+        return counts
+    # with EDA reports on, workers import the profiling backend while they
+    # parse and score their first file
+    initializer, initargs = (warm_up, (WORKER_WARM_UP_MODULES,)) if settings["eda"] is not None else (None, ())
+    with ProcessPoolExecutor(min(workers, len(pending)), mp_context=multiprocessing.get_context("spawn"),
+                             initializer=initializer, initargs=initargs) as pool:
+        futures = [pool.submit(_run_file, path, settings, file_hash) for path, file_hash in pending]
+        for future in as_completed(futures):
+            record, spans = future.result()
+            for span in spans:
+                get_recorder().record(span)
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            counts[record["status"]] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score and summarize many data files without the UI")
+    parser.add_argument("paths", nargs="+", help="directories, files or glob patterns")
+    parser.add_argument("--recursive", action="store_true", help="scan directories recursively")
+    parser.add_argument("--output", default="-",
+                        help="JSON Lines file to append to (default: stdout); files already in it are skipped")
+    parser.add_argument("--reprocess", action="store_true", help="analyze files already in the output again")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--duplicate-mode", choices=list(DUPLICATE_MODES), default="exact")
+    parser.add_argument("--statistics", choices=list(STATISTICS_MODES), default="exact")
+    parser.add_argument("--engine", choices=list(COMPUTE_ENGINES), default="pandas",
+                        help="duckdb scans each file in place with bounded memory instead of loading it")
+    parser.add_argument("--insight", action="append", choices=INSIGHT_OPTIONS, dest="insights",
+                        help=f"quick insight to include, repeatable (default: {', '.join(DEFAULT_INSIGHTS)})")
+    parser.add_argument("--eda", action="store_true", help="also write an EDA report per file")
+    parser.add_argument("--eda-mode", choices=list(EDA_MODES), default="minimal")
+    parser.add_argument("--row-budget", type=int, default=DEFAULT_ROW_BUDGET)
+    parser.add_argument("--report-dir", default=REPORT_DIR)
+    parser.add_argument("--metrics-dir", help="export span timings and cache counters to this directory")
+    args = parser.parse_args()
+    if args.eda and args.engine != "pandas":
+        parser.error("--eda profiles the loaded frame and needs --engine pandas")
+
+    files = find_files(args.paths, args.recursive)
+    if not files:
+        raise SystemExit(f"no {', '.join(EXTENSIONS)} files match {' '.join(args.paths)}")
+
+    settings = {
+        "duplicate_mode": args.duplicate_mode,
+        "statistics": args.statistics,
+        "engine": args.engine,
+        "insights": args.insights or DEFAULT_INSIGHTS,
+        "eda": eda_settings(args.eda_mode, args.row_budget) if args.eda else None,
+        "report_dir": args.report_dir,
+    }
+    to_file = args.output != "-"
+    skip = set() if args.reprocess or not to_file else processed_keys(args.output)
+    output = open(args.output, "a") if to_file else sys.stdout
+    try:
+        counts = run_batch(files, settings, output, args.workers, skip)
+    finally:
+        if to_file:
+            output.close()
+
+    if args.metrics_dir:
+        get_recorder().export(args.metrics_dir)
+    print(", ".join(f"{count} {status}" for status, count in counts.items()), file=sys.stderr)
+    if counts["error"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
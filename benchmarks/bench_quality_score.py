@@ -0,0 +1,148 @@
+# Compares the vectorized calculate_score against the baseline per-column
+# implementation on wide frames and checks that both produce the same score.
+# "cold" computes every column statistic; "warm" is a rerun on a dataset
+# whose statistics are already in its ColumnStatsStore.
+#
+#   python -m benchmarks.bench_quality_score --rows 20000 --cols 600
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from column_stats import ColumnStatsStore
+from data_quality_score import calculate_score
+
+
+def reference_score(df):
+    # calculate_score as it was in the baseline, before any of the backlog
+    # changes (only its st.cache_data decorator is dropped), kept verbatim
+    # so the comparison is against the code that actually shipped
+    total_score = 0
+    max_score = 100
+    factors = []
+
+    #1.Missing values (25points)
+    missing_percentage = df.isnull().sum().sum()/ (df.shape[0] * df.shape[1])
+    missing_score = 25 * (1 - missing_percentage)
+    total_score += missing_score
+    factors.append(f"Missing values: {missing_score:.1f}/25 ({missing_percentage:.1%} missing)")
+
+    #2.Duplicates (15points)
+    duplicate_percentage = df.duplicated().sum()/ df.shape[0]
+    duplicate_score = 15*(1 - duplicate_percentage)
+    total_score += duplicate_score
+    factors.append(f"Duplicates: {duplicate_score:.1f}/15 ({duplicate_percentage:.1%} duplicates)")
+
+    #3.Data types consistency (20points)
+    numeric_cols = df.select_dtypes(include=[np.number]).shape[1]
+    categoric_cols = df.select_dtypes(include=['object', 'category']).shape[1]
+    dtypes_score = 20 * (1- (abs( numeric_cols - categoric_cols) / max(1, df.shape[1])))
+    total_score += dtypes_score
+    factors.append(f"Data Types: {dtypes_score:.1f}/20 ({numeric_cols} numeric, {categoric_cols} categorical)")
+
+    #4.Column Names (10points)
+    invalid_chars = sum(1 for col in df.columns if any(c in col for c in [' ', '-', '*', '/', '.']))
+    naming_score = 10 * (1 - (invalid_chars / max(1, len(df.columns))))
+    total_score += naming_score
+    factors.append(f"Column Names: {naming_score:.1f}/10 ({invalid_chars} columns with special chars)")
+
+    #5.Data Volume (15points)
+    volume_score = min(15, (df.shape[0] * df.shape[1])/1000)
+    total_score += volume_score
+    factors.append(f"Data Volume: {volume_score:.1f}/15 ({df.shape[0]} rows × {df.shape[1]} columns)")
+
+    #6.Outliers (15points)
+    numeric_cols_count = df.select_dtypes(include=[np.number]).shape[1]
+    if numeric_cols_count > 0:
+        outlier_scores = []
+        numeric_df = df.select_dtypes(include=[np.number])
+        for col in numeric_df.columns:
+            if numeric_df[col].notna().sum() > 0:
+                Q1 = df[col].quantile(0.25)
+                Q3 = df[col].quantile(0.75)
+                IQR = Q3 - Q1
+
+                if IQR > 0:
+                    outliers = ((df[col] < (Q1 - 1.5 * IQR)) | (df[col] > (Q3 + 1.5 * IQR))).sum()
+                    outlier_percentage = outliers / df.shape[0]
+                    outlier_scores.append(1 - outlier_percentage)
+                else:
+                    outlier_scores.append(1.0)
+        if outlier_scores:
+            outlier_score = 15 * (sum(outlier_scores) / len(outlier_scores))
+            total_score += outlier_score
+            factors.append(f"Outliers: {outlier_score:.1f}/15 (numeric columns analysis)")
+        else:
+            factors.append("Outliers: N/A (no valid numeric columns for analysis)")
+    else:
+        factors.append("Outliers: N/A (no numeric columns)")
+
+    total_score = max(0 , min(100, total_score))
+
+    return total_score, factors
+
+
+def make_wide_frame(rows, cols, null_rate=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            values = rng.normal(size=rows)
+        elif kind == 1:
+            values = rng.integers(0, 1000, size=rows).astype(float)
+        elif kind == 2:
+            values = rng.lognormal(size=rows)
+        else:
+            values = rng.choice(["a", "b", "c", "d"], size=rows).astype(object)
+        if null_rate and i % 3:
+            values[rng.random(rows) < null_rate] = np.nan if kind < 3 else None
+        data[f"col_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def best_of(fn, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark calculate_score on a wide synthetic frame")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--cols", type=int, default=600)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--duplicate-mode", default="exact", choices=["exact", "fingerprint", "estimate"])
+    args = parser.parse_args()
+
+    df = make_wide_frame(args.rows, args.cols, args.null_rate)
+    reference_time, expected = best_of(reference_score, df, args.repeat)
+    vectorized_time, actual = best_of(
+        lambda frame: calculate_score(frame, duplicate_mode=args.duplicate_mode), df, args.repeat
+    )
+
+    # a rerun on a dataset whose column statistics are already in the store
+    stats = ColumnStatsStore()
+    stats.get(df)
+    warm_time, warm = best_of(
+        lambda frame: calculate_score(frame, duplicate_mode=args.duplicate_mode, stats=stats), df, args.repeat
+    )
+
+    # the estimate mode counts duplicates approximately, so only the exact
+    # modes must reproduce the baseline score
+    if args.duplicate_mode != "estimate" and (actual[0] != expected[0] or warm[0] != expected[0]):
+        raise SystemExit(f"score mismatch: {actual[0]!r} != {expected[0]!r}")
+
+    print(f"frame: {args.rows} rows x {args.cols} columns, score {actual[0]!r} (baseline {expected[0]!r})")
+    print(f"baseline:         {reference_time:.3f}s")
+    print(f"vectorized, cold: {vectorized_time:.3f}s ({reference_time / vectorized_time:.1f}x)")
+    print(f"vectorized, warm: {warm_time:.3f}s ({reference_time / warm_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Measures the cold start of the app: a fresh interpreter runs main.py once
+# (Streamlit's bare mode, no upload), which is the work done before the
+# uploader is first painted. Fails when the best of --repeat runs exceeds
+# the budget, or when a heavy backend is imported before it is needed.
+#
+#   python -m benchmarks.bench_startup --budget 1.5
+import argparse
+import subprocess
+import sys
+
+from lazy_imports import WARM_UP_MODULES, WORKER_WARM_UP_MODULES
+
+STARTUP_BUDGET_S = 1.5
+HEAVY_MODULES = WARM_UP_MODULES + WORKER_WARM_UP_MODULES + ("seaborn", "matplotlib.pyplot", "statsmodels.api")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print("startup", elapsed, ",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def cold_start():
+    # (seconds to run main.py in a fresh interpreter, heavy modules it imported)
+    probe = _PROBE.format(heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+    # Streamlit prints its own notices in bare mode; take the probe's line
+    _, elapsed, *loaded = [line for line in output.splitlines() if line.startswith("startup ")][-1].split(" ")
+    return float(elapsed), [name for name in "".join(loaded).split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the app's cold start against a time budget")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_S, help="seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.repeat)]
+    best = min(elapsed for elapsed, _ in runs)
+    loaded = sorted({name for _, names in runs for name in names})
+    print(f"cold start: best {best:.2f}s of {args.repeat} (budget {args.budget:.2f}s)")
+    if loaded:
+        print(f"heavy modules imported at startup: {', '.join(loaded)}", file=sys.stderr)
+    if best > args.budget or loaded:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
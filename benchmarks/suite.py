@@ -0,0 +1,200 @@
+# Headless benchmarks of every analysis path on a seeded synthetic dataset.
+# Each operation is called directly (no Streamlit UI) and reports its best
+# wall time, its peak RSS growth and its peak traced allocations. Results
+# can be saved as a baseline and later runs compared against it:
+#
+#   python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.suite --baseline benchmarks/baseline.json
+#
+# A comparison exits non-zero when any metric regresses beyond --tolerance.
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from analysis.auto_eda import generate_eda
+from analysis.quick_insights import quick_insights
+from benchmarks.synthetic import DEFAULT_DTYPE_MIX, UploadedBytes, make_csv
+from column_stats import ColumnStatsStore
+from correlation import correlation_matrix
+from data_quality_score import calculate_score
+from file_handler import is_valid_csv
+from instrumentation import rss_bytes
+from visualization import build_figure
+
+METRICS = ("wall_s", "peak_rss_mb", "alloc_peak_mb")
+# differences below these are noise, whatever the ratio
+NOISE_FLOOR = {"wall_s": 0.05, "peak_rss_mb": 8.0, "alloc_peak_mb": 2.0}
+RSS_SAMPLE_INTERVAL = 0.002
+
+
+class RSSSampler:
+    # Samples the resident set size on a background thread while an
+    # operation runs; peak_growth is the highest RSS seen minus the RSS at
+    # the start.
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+    @property
+    def peak_growth(self):
+        return self.peak - self.start
+
+
+def measure(fn, repeat):
+    # Timed runs first, then one run under RSS sampling and one under
+    # tracemalloc, which slows allocation-heavy code too much to time.
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    with RSSSampler() as rss:
+        fn()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_s": min(timings),
+        "peak_rss_mb": rss.peak_growth / 1024**2,
+        "alloc_peak_mb": peak / 1024**2,
+    }
+
+
+def build_operations(data, df, report_dir):
+    # name -> zero-argument callable; every call starts from a cold state
+    # (fresh upload, fresh column statistics) so runs are comparable
+    numeric = df.select_dtypes("number").columns
+    categorical = df.select_dtypes("object").columns
+    options = ["Shape of Dataset", "Info", "Describe", "Null Values Count",
+               "Numerical Columns", "Categorical Columns"]
+
+    operations = {
+        "is_valid_csv": lambda: is_valid_csv(UploadedBytes(data)),
+        "calculate_score": lambda: calculate_score(df),
+        "calculate_score[fingerprint]": lambda: calculate_score(df, duplicate_mode="fingerprint"),
+        "calculate_score[approximate]": lambda: calculate_score(df, stats=ColumnStatsStore("approximate")),
+        "quick_insights": lambda: quick_insights(df, options),
+        "correlation_matrix": lambda: correlation_matrix(df),
+        "generate_eda[minimal]": lambda: generate_eda(
+            df, os.path.join(report_dir, "eda.html"), mode="minimal", row_budget=5_000
+        ),
+    }
+    charts = []
+    if len(categorical):
+        charts += [("Bar Graph", categorical[0], None), ("Pie Chart", categorical[0], None)]
+    if len(numeric):
+        charts += [("Line Chart", numeric[0], None), ("Histogram", numeric[0], None),
+                   ("Box Plot", numeric[0], None)]
+    if len(numeric) > 1:
+        charts += [("Scatter Plot", numeric[0], numeric[1]), ("Correlation Heatmap", numeric[0], numeric[1])]
+    for chart, column, second in charts:
+        operations[f"build_figure[{chart}]"] = (
+            lambda chart=chart, column=column, second=second: build_figure(df, chart, column, second)
+        )
+    return operations
+
+
+def compare(results, baseline, tolerance):
+    # [(operation, metric, baseline, current)] beyond tolerance and the noise floor
+    regressions = []
+    for name, metrics in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), metrics[metric]
+            if old is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > NOISE_FLOOR[metric]:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def parse_dtype_mix(text):
+    # "float=0.4,int=0.2,category=0.3,text=0.1"
+    mix = {}
+    for part in text.split(","):
+        kind, _, share = part.partition("=")
+        if kind.strip() not in DEFAULT_DTYPE_MIX:
+            raise argparse.ArgumentTypeError(f"unknown column kind: {kind}")
+        mix[kind.strip()] = float(share)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis paths on a synthetic dataset")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--dtype-mix", type=parse_dtype_mix, default=DEFAULT_DTYPE_MIX)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="regular expression selecting operations to run")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative growth of a metric before it counts as a regression")
+    args = parser.parse_args()
+
+    config = {
+        "rows": args.rows, "cols": args.cols, "dtype_mix": args.dtype_mix, "null_rate": args.null_rate,
+        "duplicate_rate": args.duplicate_rate, "cardinality": args.cardinality, "seed": args.seed,
+    }
+    data, df = make_csv(**config)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            raise SystemExit(f"baseline was recorded with {baseline['config']}, not {config}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as report_dir:
+        for name, fn in build_operations(data, df, report_dir).items():
+            if args.only and not re.search(args.only, name):
+                continue
+            results[name] = measure(fn, args.repeat)
+            metrics = results[name]
+            print(f"{name:<34} {metrics['wall_s']:8.3f}s {metrics['peak_rss_mb']:9.1f} MB rss "
+                  f"{metrics['alloc_peak_mb']:9.1f} MB alloc", flush=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.3f} -> {new:.3f} ({new / old - 1:+.0%})", file=sys.stderr)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
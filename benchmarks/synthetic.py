@@ -0,0 +1,99 @@
+# Seeded synthetic datasets for the benchmarks. The same arguments always
+# produce the same frame (and the same CSV bytes), so timings of two runs
+# are comparable.
+#
+#   python -m benchmarks.synthetic --rows 100000 --cols 40 --out data.csv
+import argparse
+import io
+
+import numpy as np
+import pandas as pd
+
+# share of columns per kind; the remainder after rounding goes to "float"
+DEFAULT_DTYPE_MIX = {"float": 0.4, "int": 0.2, "category": 0.3, "text": 0.1}
+
+
+def _column_kinds(cols, dtype_mix):
+    # round-robin over the kinds so any prefix of the columns has a similar mix
+    total = sum(dtype_mix.values())
+    remaining = {kind: int(round(cols * share / total)) for kind, share in dtype_mix.items()}
+    kinds = []
+    while len(kinds) < cols and any(remaining.values()):
+        for kind in remaining:
+            if remaining[kind] and len(kinds) < cols:
+                kinds.append(kind)
+                remaining[kind] -= 1
+    return kinds + ["float"] * (cols - len(kinds))
+
+
+def make_frame(rows=10_000, cols=20, dtype_mix=None, null_rate=0.05, duplicate_rate=0.0,
+               cardinality=50, seed=0):
+    # null_rate: share of missing cells in each column but the first.
+    # duplicate_rate: share of rows replaced by copies of other rows.
+    # cardinality: distinct values of categorical columns.
+    rng = np.random.default_rng(seed)
+    kinds = _column_kinds(cols, dtype_mix or DEFAULT_DTYPE_MIX)
+    categories = np.array([f"cat_{i}" for i in range(max(1, cardinality))], dtype=object)
+    data = {}
+    for i, kind in enumerate(kinds):
+        if kind == "int":
+            values = rng.integers(0, 1_000_000, size=rows)
+        elif kind == "category":
+            # skewed frequencies, like real categorical data
+            weights = 1 / np.arange(1, len(categories) + 1)
+            values = rng.choice(categories, size=rows, p=weights / weights.sum())
+        elif kind == "text":
+            values = np.array([f"row {j} note {k}" for j, k in enumerate(rng.integers(0, 10**9, size=rows))],
+                              dtype=object)
+        else:
+            values = rng.lognormal(size=rows) if i % 2 else rng.normal(size=rows)
+        if null_rate and i:
+            # like a CSV reader, integer columns with gaps become floats
+            values = values.astype(np.float64) if kind == "int" else values
+            values[rng.random(rows) < null_rate] = np.nan if values.dtype.kind == "f" else None
+        data[f"{kind}_{i}"] = values
+
+    df = pd.DataFrame(data)
+    n_duplicates = int(rows * duplicate_rate)
+    if n_duplicates and rows > 1:
+        source = np.arange(rows)
+        source[rng.choice(rows, size=n_duplicates, replace=False)] = rng.integers(0, rows, size=n_duplicates)
+        df = df.iloc[source].reset_index(drop=True)
+    return df
+
+
+def make_csv(**options):
+    # (csv_bytes, frame) for the same arguments as make_frame
+    df = make_frame(**options)
+    return df.to_csv(index=False).encode(), df
+
+
+class UploadedBytes(io.BytesIO):
+    # what the upload handlers see from st.file_uploader: a file-like
+    # object with a name and a size
+    def __init__(self, data, name="synthetic.csv"):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic CSV")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic.csv")
+    args = parser.parse_args()
+
+    data, df = make_csv(rows=args.rows, cols=args.cols, null_rate=args.null_rate,
+                        duplicate_rate=args.duplicate_rate, cardinality=args.cardinality, seed=args.seed)
+    with open(args.out, "wb") as f:
+        f.write(data)
+    print(f"wrote {args.out}: {df.shape[0]} rows x {df.shape[1]} columns, {len(data) / 1024**2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 5_000        # max data points sent to the browser per chart
+MAX_CATEGORIES = 50       # bars kept by bar/count plots before "Other"
+PIE_TOP_N = 10            # slices kept by pie charts before "Other"
+HISTOGRAM_BINS = 20
+DENSITY_BINS = 60         # cells per axis for density scatter plots
+
+
+def top_n_counts(series, n):
+    return truncate_counts(series.value_counts(), n)
+
+
+def truncate_counts(counts, n):
+    # value counts cut to the n most frequent values, then the rest as "Other"
+    if len(counts) <= n:
+        return counts
+    other = counts.iloc[n:].sum()
+    top = counts.iloc[:n]
+    return pd.Series(
+        list(top.values) + [other],
+        index=pd.Index(list(top.index.astype(str)) + ["Other"], name=counts.index.name),
+        name=counts.name
+    )
+
+
+def numeric_values(series):
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def histogram_bins(series, nbins=HISTOGRAM_BINS, value_range=None):
+    # Returns (bin_left_edges, bin_widths, counts) computed server side.
+    # value_range is the (min, max) of the finite values when already known.
+    values = numeric_values(series)
+    if not len(values):
+        return np.array([]), np.array([]), np.array([], dtype=np.int64)
+    counts, edges = np.histogram(values, bins=nbins, range=value_range)
+    return edges[:-1], np.diff(edges), counts
+
+
+def box_stats(series, max_outliers=MAX_POINTS, quartiles=None, mean=None):
+    # Quartiles and Tukey fences, plus at most max_outliers outlier points.
+    # Precomputed quartiles (q1, median, q3) and mean skip the sort.
+    values = numeric_values(series)
+    if not len(values):
+        return None
+    q1, median, q3 = quartiles if quartiles is not None else np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if len(outliers) > max_outliers:
+        # keep the extremes, fill the rest with an even sample
+        ordered = np.sort(outliers)
+        picks = np.unique(np.linspace(0, len(ordered) - 1, max_outliers).round().astype(np.int64))
+        outliers = ordered[picks]
+    return {
+        "q1": q1, "median": median, "q3": q3,
+        "lowerfence": inside.min(), "upperfence": inside.max(),
+        "mean": values.mean() if mean is None else mean, "outliers": outliers,
+    }
+
+
+def minmax_decimate(x, y, n_out):
+    # Keeps the min and max of each of n_out/2 buckets, preserving spikes
+    if len(y) <= n_out:
+        return x, y
+    n_buckets = max(1, n_out // 2)
+    size = -(-len(y) // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:len(y)] = y
+    rows = padded.reshape(n_buckets, size)
+    valid = ~np.isnan(rows).all(axis=1)
+    offsets = np.arange(n_buckets)[valid] * size
+    keep = np.unique(np.concatenate([
+        offsets + np.nanargmin(rows[valid], axis=1),
+        offsets + np.nanargmax(rows[valid], axis=1),
+    ]))
+    return x[keep], y[keep]
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf = np.asarray(x, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = xf[next_start:next_stop].mean() if next_stop > next_start else xf[-1]
+        avg_y = y[next_start:next_stop].mean() if next_stop > next_start else y[-1]
+        ax, ay = xf[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:stop] - ay) - (ax - xf[start:stop]) * (avg_y - ay))
+        selected = start + int(np.argmax(areas))
+        keep[i + 1] = selected
+    return x[keep], y[keep]
+
+
+def line_points(series, max_points=MAX_POINTS, method="lttb"):
+    # Decimates on row positions, then maps the kept rows back to index labels
+    if not pd.api.types.is_numeric_dtype(series):
+        # text is plotted as categories: evenly spaced rows keep their values
+        positions = np.flatnonzero(series.notna().to_numpy())
+        if len(positions) > max_points:
+            positions = positions[np.linspace(0, len(positions) - 1, max_points).round().astype(np.int64)]
+        return series.index[positions], series.iloc[positions].to_numpy(dtype=object)
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    positions = np.flatnonzero(np.isfinite(values))
+    decimate = minmax_decimate if method == "minmax" else lttb
+    x, y = decimate(positions, values[positions], max_points)
+    return series.index[x], y
+
+
+def sample_rows(df, max_points=MAX_POINTS, random_state=0):
+    if len(df) <= max_points:
+        return df
+    rng = np.random.default_rng(random_state)
+    return df.iloc[np.sort(rng.choice(len(df), size=max_points, replace=False))]
+
+
+def trend_line(x_series, y_series):
+    # (x, y) end points of the least-squares line through the pairs where
+    # both values are finite, or None when x has fewer than two values
+    x = pd.to_numeric(x_series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    y = pd.to_numeric(y_series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    if len(x) < 2 or x.min() == x.max():
+        return None
+    slope, intercept = np.polyfit(x, y, 1)
+    ends = np.array([x.min(), x.max()])
+    return ends, slope * ends + intercept
+
+
+def density_grid(x_series, y_series, bins=DENSITY_BINS):
+    # 2D histogram of the pairs where both values are finite
+    x = pd.to_numeric(x_series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    y = pd.to_numeric(y_series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return x_centers, y_centers, counts.T
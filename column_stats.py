@@ -0,0 +1,419 @@
+import copy
+import functools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import get_registry
+from parallel import map_column_groups
+from sketches import HyperLogLog, KLLSketch, TopValues
+
+DESCRIBE_QUANTILES = (0.25, 0.5, 0.75)
+DISTINCT_PRECISION = 12       # HyperLogLog registers per column: 4096 bytes, ~1.6% error
+KLL_K = 200                   # quantile sketch size: ~1.3% rank error
+SKETCH_CHUNK_ROWS = 100_000   # rows summarized per chunk before merging
+
+STATISTICS_MODES = {
+    "exact": "Exact",
+    "approximate": "Approximate (sketches)",
+}
+
+
+def lerp(a, b, t):
+    # same interpolation (and rounding) as np.quantile's "linear" method
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def numeric_quantiles(values, valid, qs=DESCRIBE_QUANTILES):
+    # Quantiles of every column of a float block, matching Series.quantile
+    # exactly. Complete columns go through one batched np.quantile call;
+    # columns with nulls are sorted together (NaNs sort last) and interpolated
+    # per column from their own non-null count. Returns a (len(qs), cols) array.
+    counts = valid.sum(axis=0)
+    result = np.full((len(qs), values.shape[1]), np.nan)
+
+    complete = np.flatnonzero(counts == values.shape[0])
+    if len(complete) and values.shape[0]:
+        result[:, complete] = np.quantile(values[:, complete], qs, axis=0)
+
+    partial = np.flatnonzero((counts > 0) & (counts < values.shape[0]))
+    if len(partial):
+        ordered = np.sort(values[:, partial], axis=0)
+        last = counts[partial] - 1
+        for row, q in enumerate(qs):
+            virtual = last * q
+            previous = np.minimum(np.floor(virtual).astype(np.intp), last)
+            following = np.minimum(previous + 1, last)
+            following[virtual >= last] = last[virtual >= last]
+            a = np.take_along_axis(ordered, previous[None, :], axis=0)[0]
+            b = np.take_along_axis(ordered, following[None, :], axis=0)[0]
+            result[row, partial] = lerp(a, b, virtual - np.floor(virtual))
+    return result
+
+
+def count_outliers(values, q1, q3):
+    iqr = q3 - q1
+    outside = (values < (q1 - 1.5 * iqr)) | (values > (q3 + 1.5 * iqr))
+    return outside.sum(axis=0), iqr
+
+
+def is_numeric(dtype):
+    # the columns select_dtypes(include=[np.number]) picks: bools excluded
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def select_columns(df, include):
+    # df.select_dtypes(include=...).columns without copying the selected
+    # data, which on a freshly concatenated frame also consolidates it.
+    # Engine-backed tables answer head(0) from their schema.
+    return df.head(0).select_dtypes(include=include).columns.tolist()
+
+
+def is_plain_numeric(dtype):
+    # numpy int/uint/float64 columns, whose moments are computed exactly the
+    # way pandas' nanops do; other numeric dtypes defer to pandas itself
+    return isinstance(dtype, np.dtype) and (dtype.kind in "iu" or dtype == np.float64)
+
+
+class ColumnStats:
+    # Summary of one column. count/mean/m2 follow Welford's formulation so two
+    # summaries merge exactly (Chan et al.). Exact quantiles and outlier counts
+    # cannot be merged; summaries carrying a quantile sketch derive them from
+    # the merged sketch instead.
+    def __init__(self, dtype, rows=0, nulls=0, minimum=np.nan, maximum=np.nan, mean=np.nan,
+                 m2=0.0, quantiles=None, outliers=None, distinct=None, sketch=None, top_values=None):
+        self.dtype = dtype
+        self.rows = rows
+        self.nulls = nulls
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.m2 = m2
+        self.quantiles = quantiles        # {q: value} for DESCRIBE_QUANTILES
+        self.outliers = outliers          # values outside the Tukey fences
+        self.distinct = distinct          # HyperLogLog of non-null values
+        self.sketch = sketch              # KLLSketch of numeric values
+        self.top_values = top_values      # TopValues of non-numeric values
+
+    @property
+    def count(self):
+        return self.rows - self.nulls
+
+    @property
+    def numeric(self):
+        return is_numeric(self.dtype)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def approximate(self):
+        return self.sketch is not None
+
+    def distinct_count(self):
+        return self.distinct.count() if self.distinct is not None else None
+
+    def top_counts(self, n, name=None):
+        # approximate value counts, shaped like chart_data.top_n_counts: the
+        # n most frequent values, then the rest as "Other"
+        if self.top_values is None:
+            return None
+        top = self.top_values.top(n)
+        labels = [str(value) for value, _ in top]
+        counts = [count for _, count in top]
+        other = self.count - sum(counts)
+        if other > 0 and len(top) == n:
+            labels.append("Other")
+            counts.append(other)
+        return pd.Series(counts, index=pd.Index(labels, name=name), name="count")
+
+    def summarize_sketch(self):
+        # quartiles from the sketch, and the outlier count from the sketch's
+        # estimated ranks of the Tukey fences
+        if self.sketch is None or not self.sketch.count:
+            return
+        q1, median, q3 = self.sketch.quantiles(DESCRIBE_QUANTILES)
+        self.quantiles = dict(zip(DESCRIBE_QUANTILES, (q1, median, q3)))
+        iqr = q3 - q1
+        below = self.sketch.rank(q1 - 1.5 * iqr, inclusive=False)
+        above = 1 - self.sketch.rank(q3 + 1.5 * iqr)
+        self.outliers = int(round((below + above) * self.count))
+
+    def merge(self, other):
+        count = self.count + other.count
+        merged = ColumnStats(
+            self.dtype if self.dtype == other.dtype else np.dtype(object),
+            rows=self.rows + other.rows, nulls=self.nulls + other.nulls,
+            minimum=np.fmin(self.minimum, other.minimum) if self.numeric else np.nan,
+            maximum=np.fmax(self.maximum, other.maximum) if self.numeric else np.nan,
+        )
+        if self.numeric and count:
+            if not self.count:
+                merged.mean, merged.m2 = other.mean, other.m2
+            elif not other.count:
+                merged.mean, merged.m2 = self.mean, self.m2
+            else:
+                delta = other.mean - self.mean
+                merged.mean = self.mean + delta * other.count / count
+                merged.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        if self.distinct is not None and other.distinct is not None:
+            merged.distinct = HyperLogLog(self.distinct.precision).merge(self.distinct).merge(other.distinct)
+        if self.sketch is not None and other.sketch is not None:
+            merged.sketch = copy.deepcopy(self.sketch).merge(other.sketch)
+            merged.summarize_sketch()
+        if self.top_values is not None and other.top_values is not None:
+            merged.top_values = copy.deepcopy(self.top_values).merge(other.top_values)
+        return merged
+
+
+def _numeric_moments(array):
+    # mean and sum of squared deviations computed exactly as pandas'
+    # nanmean/nanvar do, so describe() built from them is bit-identical
+    mask = np.isnan(array) if array.dtype.kind == "f" else None
+    count = array.shape[0] - (mask.sum() if mask is not None else 0)
+    if not count:
+        return np.nan, 0.0, np.nan, np.nan
+    if mask is not None:
+        filled = array.copy()
+        np.putmask(filled, mask, 0)
+        mean = filled.sum(dtype=np.float64) / count
+        avg = mean
+        sqr = (avg - filled) ** 2
+        np.putmask(sqr, mask, 0)
+        return mean, sqr.sum(dtype=np.float64), np.nanmin(array), np.nanmax(array)
+    mean = array.sum(dtype=np.float64) / count
+    as_float = array.astype("f8")
+    avg = as_float.sum(dtype=np.float64) / count
+    return mean, ((avg - as_float) ** 2).sum(dtype=np.float64), array.min(), array.max()
+
+
+def distinct_sketch(series, valid=None):
+    valid = series.notna().to_numpy() if valid is None else valid
+    hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    return HyperLogLog(DISTINCT_PRECISION).add_hashes(hashes[valid])
+
+
+def distinct_sketches(df, columns):
+    return {col: distinct_sketch(df[col]) for col in columns}
+
+
+def sketch_column_stats(df, columns, with_distinct=False):
+    # Summary of one block of rows built only from mergeable parts: moments,
+    # a KLL quantile sketch per numeric column and approximate top values for
+    # the others. Chunks of a file, or blocks handled by different workers,
+    # merge with ColumnStats.merge.
+    stats = {}
+    null_mask = df[list(columns)].isna().to_numpy()
+    for i, col in enumerate(columns):
+        series = df[col]
+        entry = ColumnStats(series.dtype, rows=len(series), nulls=int(null_mask[:, i].sum()))
+        if is_numeric(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            entry.mean, entry.m2, entry.minimum, entry.maximum = _numeric_moments(values)
+            entry.sketch = KLLSketch(KLL_K).update(values)
+            entry.summarize_sketch()
+        else:
+            entry.top_values = TopValues().update(series)
+        if with_distinct:
+            entry.distinct = distinct_sketch(series, ~null_mask[:, i])
+        stats[col] = entry
+    return stats
+
+
+def merge_chunk_stats(chunks, columns, with_distinct=False, empty=None):
+    # Sketch summaries of consecutive row chunks, merged in order; empty is
+    # the zero-row frame summarized when there are no chunks at all
+    merged = None
+    for frame in chunks:
+        chunk = sketch_column_stats(frame, columns, with_distinct)
+        merged = chunk if merged is None else {col: merged[col].merge(chunk[col]) for col in columns}
+    if merged is None:
+        merged = sketch_column_stats(empty, columns, with_distinct)
+    return merged
+
+
+def approximate_column_stats(df, columns, with_distinct=False, chunk_rows=SKETCH_CHUNK_ROWS):
+    # Never holds more than one chunk's worth of sorted values per column
+    chunks = (df.iloc[start:start + chunk_rows] for start in range(0, max(1, len(df)), chunk_rows))
+    return merge_chunk_stats(chunks, columns, with_distinct)
+
+
+def compute_column_stats(df, columns, with_distinct=False, approximate=False):
+    # One pass per column for the moments plus one batched quantile/outlier
+    # pass over the numeric block. Distinct-count sketches cost a hash of
+    # every value, so they are only built when asked for.
+    # Returns {column: ColumnStats}.
+    if approximate:
+        return approximate_column_stats(df, columns, with_distinct)
+    stats = {}
+    null_mask = df[list(columns)].isna().to_numpy()
+    numeric = [col for col in columns if is_numeric(df[col].dtype)]
+
+    for i, col in enumerate(columns):
+        series = df[col]
+        entry = ColumnStats(series.dtype, rows=len(series), nulls=int(null_mask[:, i].sum()))
+        if is_plain_numeric(series.dtype):
+            entry.mean, entry.m2, entry.minimum, entry.maximum = _numeric_moments(series.to_numpy())
+        elif col in numeric and entry.count:
+            # float32 and nullable dtypes keep pandas' own accumulation
+            entry.mean, entry.minimum, entry.maximum = series.mean(), series.min(), series.max()
+            entry.m2 = series.var() * (entry.count - 1) if entry.count > 1 else 0.0
+        if with_distinct:
+            entry.distinct = distinct_sketch(series, ~null_mask[:, i])
+        stats[col] = entry
+
+    if numeric:
+        values = df[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        positions = {col: i for i, col in enumerate(columns)}
+        valid = ~null_mask[:, [positions[col] for col in numeric]]
+        quantiles = numeric_quantiles(values, valid)
+        outliers, _ = count_outliers(values, quantiles[0], quantiles[2])
+        for i, col in enumerate(numeric):
+            stats[col].quantiles = dict(zip(DESCRIBE_QUANTILES, quantiles[:, i]))
+            stats[col].outliers = int(outliers[i])
+    return stats
+
+
+class ColumnStatsStore:
+    # Per-dataset cache of ColumnStats, filled lazily: asking for columns only
+    # computes the ones not seen before. Shared between sessions through the
+    # dataset registry, hence the lock. In "approximate" mode quantiles,
+    # outliers and top values come from mergeable sketches built per chunk.
+    def __init__(self, mode="exact"):
+        if mode not in STATISTICS_MODES:
+            raise ValueError(f"Unknown statistics mode: {mode}")
+        self.mode = mode
+        self.columns = {}
+        self.on_grow = None           # called once columns were added, e.g. to re-measure a cached store
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # stores travel to job workers and back; the lock and hook stay behind
+        return {"mode": self.mode, "columns": dict(self.columns)}
+
+    def __setstate__(self, state):
+        self.mode = state["mode"]
+        self.columns = state["columns"]
+        self.on_grow = None
+        self._lock = threading.Lock()
+
+    def __sizeof__(self):
+        with self._lock:
+            columns = list(self.columns.values())
+        size = object.__sizeof__(self) + 200 * len(columns)
+        for stats in columns:
+            if stats.distinct is not None:
+                size += stats.distinct.registers.nbytes
+            if stats.sketch is not None:
+                size += sum(level.nbytes for level in stats.sketch.levels)
+            if stats.top_values is not None:
+                size += stats.top_values.counts.table.nbytes
+        return size
+
+    @property
+    def approximate(self):
+        return self.mode == "approximate"
+
+    def error_notes(self):
+        # what the approximate figures may be off by, for display next to them
+        if not self.approximate:
+            return []
+        return [
+            f"Quartiles and outlier counts come from KLL sketches (k={KLL_K}): each quartile is within "
+            f"±{KLLSketch(KLL_K).rank_error:.2%} of its true rank with 99% confidence.",
+            "Count, mean, std, min, max and null counts are exact up to floating point rounding.",
+        ]
+
+    def get(self, df, columns=None, distinct=False, workers=1, backend="thread"):
+        # workers > 1 splits the missing columns into groups computed in
+        # parallel (see parallel.map_column_groups); results are identical.
+        # A table of an out-of-core engine (compute_engine.DuckDBTable)
+        # computes the same summaries itself, over the file.
+        columns = list(df.columns if columns is None else columns)
+        engine = getattr(df, "compute_column_stats", None)
+        with self._lock:
+            missing = [col for col in columns if col not in self.columns]
+        if missing:
+            if engine is not None:
+                computed = engine(missing, with_distinct=distinct, approximate=self.approximate)
+            else:
+                computed = map_column_groups(
+                    compute_column_stats, df, missing, workers, backend,
+                    with_distinct=distinct, approximate=self.approximate
+                )
+            with self._lock:
+                self.columns.update(computed)
+            self._grown()
+        if distinct:
+            with self._lock:
+                unsketched = [col for col in columns if self.columns[col].distinct is None]
+            if unsketched:
+                if engine is not None:
+                    sketches = df.distinct_sketches(unsketched)
+                else:
+                    sketches = map_column_groups(distinct_sketches, df, unsketched, workers, backend)
+                with self._lock:
+                    for col, sketch in sketches.items():
+                        self.columns[col].distinct = sketch
+                self._grown()
+        with self._lock:
+            return {col: self.columns[col] for col in columns}
+
+    def update(self, columns):
+        with self._lock:
+            self.columns.update(columns)
+        self._grown()
+
+    def _grown(self):
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def null_counts(self, df, workers=1, backend="thread"):
+        stats = self.get(df, workers=workers, backend=backend)
+        return pd.Series([stats[col].nulls for col in df.columns], index=df.columns, dtype=np.int64)
+
+    def describe(self, df, workers=1, backend="thread"):
+        # same output as df.describe() for frames of plain numeric columns;
+        # anything describe() formats differently is left to pandas. The
+        # approximate mode describes every numeric column from its sketch.
+        # Engine tables always describe from their statistics, which they
+        # compute in float64 for every numeric dtype.
+        numeric = select_columns(df, [np.number])
+        if not numeric:
+            return df.describe()
+        if not self.approximate and not hasattr(df, "compute_column_stats") and (
+                any(not is_plain_numeric(df.dtypes[col]) for col in numeric)
+                or select_columns(df, ["datetime", "datetimetz"])):
+            return df.describe()
+        stats = self.get(df, numeric, workers=workers, backend=backend)
+        rows = {
+            "count": [float(stats[col].count) for col in numeric],
+            "mean": [stats[col].mean for col in numeric],
+            "std": [stats[col].std for col in numeric],
+            "min": [stats[col].minimum for col in numeric],
+        }
+        for q in DESCRIBE_QUANTILES:
+            rows[f"{q:.0%}"] = [
+                stats[col].quantiles[q] if stats[col].quantiles is not None else np.nan for col in numeric
+            ]
+        rows["max"] = [stats[col].maximum for col in numeric]
+        return pd.DataFrame(rows, index=numeric, dtype=np.float64).T
+
+
+def get_column_stats(dataset_hash, mode="exact"):
+    # The store of a dataset lives in the registry next to the frame, so it
+    # is shared by every session looking at the same file. It is cached
+    # empty and filled later, so the registry re-measures it as it grows.
+    registry = get_registry()
+    params = {"mode": mode}
+    store = registry.cached(dataset_hash, "column_stats", params, ColumnStatsStore, mode)
+    if store.on_grow is None:
+        store.on_grow = functools.partial(registry.resize, dataset_hash, "column_stats", params)
+    return store
@@ -0,0 +1,457 @@
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from column_stats import (
+    DESCRIBE_QUANTILES, SKETCH_CHUNK_ROWS, ColumnStats, distinct_sketch, is_numeric,
+    lerp, merge_chunk_stats,
+)
+from file_handler import validate_columns
+from instrumentation import instrumented
+from lazy_imports import LazyModule
+from sketches import HyperLogLog, fingerprint_collision_bound, row_fingerprints
+
+duckdb = LazyModule("duckdb")
+pa_dataset = LazyModule("pyarrow.dataset")
+
+COMPUTE_ENGINES = {
+    "pandas": "pandas (in memory)",
+    "duckdb": "DuckDB (out of core)",
+}
+MEMORY_LIMIT = "512MB"                        # DuckDB spills sorts and hash tables past this
+TEMP_DIR = os.path.join(".cache", "duckdb")
+UPLOAD_DIR = os.path.join(".cache", "uploads")
+SAMPLE_ROWS = 100_000                         # in-memory sample behind previews, point charts and EDA
+# the strings pd.read_csv reads as missing by default (pandas 2.x)
+NA_STRINGS = (
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+)
+# read_csv settings that make DuckDB type and null columns the way
+# pd.read_csv does: no date sniffing, and pandas' default NA strings.
+# DuckDB parses floats correctly rounded, as file_handler's parser does
+# with float_precision="round_trip".
+CSV_OPTIONS = (
+    "header=true, auto_type_candidates=['BOOLEAN', 'BIGINT', 'DOUBLE', 'VARCHAR'], "
+    f"nullstr=[{', '.join(repr(value) for value in NA_STRINGS)}]"
+)
+
+
+def available_engines():
+    return [name for name in COMPUTE_ENGINES if name == "pandas" or importlib.util.find_spec(name)]
+
+
+def _quote(column):
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def _rechunk(batches, rows):
+    # record batches regrouped into tables of exactly `rows` rows (the last
+    # one shorter), so chunked summaries line up with the in-memory path
+    pending, size = [], 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        size += batch.num_rows
+        while size >= rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, rows)
+            rest = table.slice(rows)
+            pending, size = rest.to_batches(), rest.num_rows
+    if size:
+        yield pa.Table.from_batches(pending)
+
+
+class DuckDBTable:
+    # A data file scanned in place by DuckDB instead of loaded into pandas.
+    # It stands in for the frame wherever the score, Quick Insights and the
+    # chart aggregations accept one: null counts, quantiles, value counts,
+    # histogram bins and duplicate counts run as queries over the file, and
+    # anything built from sketches streams the file in fixed-size chunks, so
+    # memory stays bounded by MEMORY_LIMIT whatever the file size. Results
+    # match the pandas path on the same data (both parse floats correctly
+    # rounded, so values and row fingerprints agree bit for bit); only mean
+    # and std may differ in the last bits, since DuckDB sums in another order.
+    #
+    # CSV files are typed like pd.read_csv types them; Parquet and Feather
+    # files (including the dataset store) keep their pandas dtypes.
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self._schema = None
+        self._rows = None
+
+    def __getstate__(self):
+        # tables travel to job workers as their path; each process opens
+        # its own connection
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __repr__(self):
+        return f"<DuckDBTable {self.path!r}>"
+
+    @property
+    def kind(self):
+        return os.path.splitext(self.path)[1].lower().lstrip(".")
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(TEMP_DIR, exist_ok=True)
+            connection = duckdb.connect(config={"memory_limit": MEMORY_LIMIT, "temp_directory": TEMP_DIR})
+            connection.execute("SET enable_progress_bar = false")
+            path = self.path.replace("'", "''")
+            if self.kind == "csv":
+                connection.execute(f"CREATE VIEW source AS SELECT * FROM read_csv('{path}', {CSV_OPTIONS})")
+            elif self.kind == "parquet":
+                connection.execute(f"CREATE VIEW source AS SELECT * FROM read_parquet('{path}')")
+            else:
+                # DuckDB has no Feather reader; pyarrow's dataset scanner
+                # streams the file with projection pushdown
+                connection.register("source", self._arrow_dataset())
+            self._connection = connection
+        return self._connection
+
+    def _arrow_dataset(self):
+        return pa_dataset.dataset(self.path, format="parquet" if self.kind == "parquet" else "feather")
+
+    def query(self, sql, params=None):
+        # rows of a query over the `source` view
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _arrow_schema(self):
+        if self.kind == "csv":
+            with self._lock:
+                return self._connect().sql("SELECT * FROM source LIMIT 0").to_arrow_table().schema
+        return self._arrow_dataset().schema
+
+    def _load_schema(self):
+        # The dtypes pandas would give the loaded file: an empty frame from
+        # the file's Arrow schema (pandas metadata included), with integer
+        # and boolean columns holding nulls widened the way a full load does
+        # (float64, object), all-null text columns as float64, and the
+        # categories of dictionary columns read from the file. One scan
+        # counts the rows and non-null values; Parquet answers it from
+        # metadata.
+        empty = self._arrow_schema().empty_table().to_pandas()
+        columns = list(empty.columns)
+        counts = self.query(
+            "SELECT count(*)" + "".join(f", count({_quote(col)})" for col in columns) + " FROM source"
+        )[0]
+        self._rows = counts[0]
+        dtypes = {}
+        for col, valid in zip(columns, counts[1:]):
+            dtype = empty[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                dtypes[col] = pd.CategoricalDtype(self._categories(col), ordered=dtype.ordered)
+            elif valid < self._rows and pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+                dtypes[col] = np.float64
+            elif valid < self._rows and pd.api.types.is_bool_dtype(dtype) and isinstance(dtype, np.dtype):
+                dtypes[col] = object
+            elif not valid and self._rows and dtype == object:
+                dtypes[col] = np.float64
+        self._schema = empty.astype(dtypes) if dtypes else empty
+
+    def _categories(self, column):
+        # the dictionaries of every batch in order of first appearance, as
+        # Arrow unifies them when pandas loads the column
+        categories = {}
+        for batch in self._arrow_dataset().to_batches(columns=[column]):
+            categories.update(dict.fromkeys(batch.column(0).dictionary.to_pylist()))
+        return list(categories)
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._load_schema()
+        return self._schema
+
+    @property
+    def columns(self):
+        return self.schema.columns
+
+    @property
+    def dtypes(self):
+        return self.schema.dtypes
+
+    @property
+    def shape(self):
+        return self.__len__(), len(self.columns)
+
+    def __len__(self):
+        if self._rows is None:
+            self._load_schema()
+        return self._rows
+
+    def _value(self, column):
+        # the column as SQL, with float NaNs read as nulls like pandas does
+        dtype = self.dtypes[column]
+        if pd.api.types.is_float_dtype(dtype):
+            return f"nullif({_quote(column)}::DOUBLE, 'NaN'::DOUBLE)"
+        return _quote(column)
+
+    def _frame(self, table):
+        # pandas frame of an Arrow result, in the schema's dtypes
+        frame = table.to_pandas()
+        return frame.astype({col: dtype for col, dtype in self.dtypes.items()
+                             if col in frame and frame[col].dtype != dtype}, copy=False)
+
+    def head(self, n=5):
+        if n <= 0:
+            return self.schema.copy()
+        with self._lock:
+            table = self._connect().sql(f"SELECT * FROM source LIMIT {int(n)}").to_arrow_table()
+        return self._frame(table)
+
+    def sample(self, n=5, seed=0):
+        # a uniform sample of rows in file order, indexed by row position
+        # like df.sample; the reservoir keeps n rows, never the whole file
+        with self._lock:
+            table = self._connect().sql(
+                "SELECT * FROM (SELECT row_number() OVER () - 1 AS __row, * FROM source) "
+                f"USING SAMPLE reservoir({int(n)} ROWS) REPEATABLE ({int(seed)}) ORDER BY __row"
+            ).to_arrow_table()
+        frame = self._frame(table.drop_columns(["__row"]))
+        frame.index = pd.Index(table.column("__row").to_numpy())
+        return frame
+
+    def batches(self, columns=None, rows=SKETCH_CHUNK_ROWS):
+        # the file as pandas frames of exactly `rows` rows
+        columns = list(self.columns if columns is None else columns)
+        if self.kind == "csv":
+            # a cursor of its own, so queries can run while the file streams
+            with self._lock:
+                cursor = self._connect().cursor()
+            batches = cursor.sql(
+                f"SELECT {', '.join(_quote(col) for col in columns)} FROM source"
+            ).to_arrow_reader(rows)
+        else:
+            batches = self._arrow_dataset().to_batches(columns=columns, batch_size=rows)
+        for table in _rechunk(batches, rows):
+            yield self._frame(table)[columns]
+
+    def info(self, buf=None):
+        # the layout of DataFrame.info(), from the schema and null counts
+        buf = buf if buf is not None else io.StringIO()
+        valid = self.query(
+            "SELECT " + ", ".join(f"count({self._value(col)})" for col in self.columns) + " FROM source"
+        )[0] if len(self.columns) else ()
+        rows = len(self)
+        width = max([len("Column")] + [len(str(col)) for col in self.columns])
+        lines = [
+            f"<class '{type(self).__name__}'> {self.path}",
+            f"RangeIndex: {rows} entries, 0 to {rows - 1}" if rows else "RangeIndex: 0 entries",
+            f"Data columns (total {len(self.columns)} columns):",
+            f" #   {'Column':<{width}}  Non-Null Count  Dtype",
+            f"---  {'-' * width}  --------------  -----",
+        ]
+        for i, (col, count) in enumerate(zip(self.columns, valid)):
+            lines.append(f" {i:<3} {str(col):<{width}}  {f'{count} non-null':<14}  {self.dtypes[col]}")
+        kinds = self.dtypes.astype(str).value_counts().sort_index()
+        lines.append("dtypes: " + ", ".join(f"{dtype}({count})" for dtype, count in kinds.items()))
+        buf.write("\n".join(lines) + "\n")
+        return buf
+
+    def describe(self):
+        # DataFrame.describe() of a frame without numeric columns: count,
+        # unique, top and freq of every column, from its value counts
+        described = {}
+        for col in self.columns:
+            counts = self.value_counts(col)
+            described[col] = pd.Series(
+                [counts.sum(), int((counts != 0).sum()),
+                 counts.index[0] if len(counts) else np.nan, counts.iloc[0] if len(counts) else np.nan],
+                index=["count", "unique", "top", "freq"], dtype=object
+            )
+        return pd.DataFrame(described)
+
+    @instrumented("engine_column_stats")
+    def compute_column_stats(self, columns, with_distinct=False, approximate=False):
+        # {column: ColumnStats} as column_stats.compute_column_stats returns
+        # for the loaded frame. Exact mode runs three scans whatever the
+        # column count: counts and moments, order statistics per numeric
+        # column, then squared deviations and Tukey fence counts.
+        # Approximate mode (and distinct sketches) streams fixed-size chunks
+        # through the same sketches the in-memory path builds.
+        columns = list(columns)
+        if approximate:
+            return merge_chunk_stats(self.batches(columns), columns, with_distinct, self.schema)
+        numeric = [col for col in columns if is_numeric(self.dtypes[col])]
+        selects = [f"count({self._value(col)})" for col in columns]
+        for col in numeric:
+            value = self._value(col)
+            selects += [f"min({value})", f"max({value})", f"fsum({value}::DOUBLE)"]
+        row = self.query(f"SELECT count(*), {', '.join(selects)} FROM source")[0]
+        rows, valid, moments = row[0], row[1:len(columns) + 1], iter(row[len(columns) + 1:])
+
+        stats = {}
+        for col, count in zip(columns, valid):
+            stats[col] = ColumnStats(self.dtypes[col], rows=rows, nulls=rows - count)
+        for col in numeric:
+            entry = stats[col]
+            minimum, maximum, total = next(moments), next(moments), next(moments)
+            if entry.count:
+                entry.minimum, entry.maximum = minimum, maximum
+                entry.mean = np.float64(total) / entry.count
+                entry.quantiles = dict(zip(DESCRIBE_QUANTILES, self._quantiles(col, entry.count)))
+
+        summarized = [col for col in numeric if stats[col].count]
+        if summarized:
+            selects, params = [], []
+            for col in summarized:
+                value, entry = f"{self._value(col)}::DOUBLE", stats[col]
+                q1, q3 = entry.quantiles[0.25], entry.quantiles[0.75]
+                iqr = q3 - q1
+                selects += [f"fsum(({value} - ?) ** 2)", f"count(*) FILTER (WHERE {value} < ? OR {value} > ?)"]
+                params += [float(entry.mean), float(q1 - 1.5 * iqr), float(q3 + 1.5 * iqr)]
+            row = iter(self.query(f"SELECT {', '.join(selects)} FROM source", params)[0])
+            for col in summarized:
+                stats[col].m2, stats[col].outliers = np.float64(next(row)), int(next(row))
+
+        if with_distinct:
+            for col, sketch in self.distinct_sketches(columns).items():
+                stats[col].distinct = sketch
+        return stats
+
+    def distinct_sketches(self, columns):
+        # HyperLogLogs merge losslessly, so sketching chunk by chunk gives
+        # the registers a sketch of the whole column would have
+        sketches = {col: distinct_sketch(self.schema[col]) for col in columns}
+        for chunk in self.batches(columns):
+            for col in columns:
+                sketches[col].merge(distinct_sketch(chunk[col]))
+        return sketches
+
+    def _quantiles(self, column, count):
+        # DESCRIBE_QUANTILES of the column's non-null values, interpolated
+        # exactly as numeric_quantiles does from the order statistics they
+        # fall between; only those ranks leave the sorting query
+        last = count - 1
+        virtual = np.array([last * q for q in DESCRIBE_QUANTILES])
+        previous = np.minimum(np.floor(virtual).astype(np.intp), last)
+        following = np.minimum(previous + 1, last)
+        following[virtual >= last] = last
+        ranks = sorted(set(previous.tolist()) | set(following.tolist()))
+        value = f"{self._value(column)}::DOUBLE"
+        ordered = dict(self.query(
+            f"SELECT rank, value FROM (SELECT row_number() OVER (ORDER BY {value}) - 1 AS rank, {value} AS value "
+            f"FROM source WHERE {value} IS NOT NULL) WHERE rank IN ({', '.join(map(str, ranks))})"
+        ))
+        a = np.array([ordered[rank] for rank in previous], dtype=np.float64)
+        b = np.array([ordered[rank] for rank in following], dtype=np.float64)
+        return lerp(a, b, virtual - np.floor(virtual))
+
+    @instrumented("engine_duplicates", tags=("mode",))
+    def count_duplicates(self, mode="exact"):
+        # (count, note) as data_quality_score.count_duplicates returns. Exact
+        # and fingerprint counts are aggregated in DuckDB (full rows, or
+        # DuckDB's own 64-bit row hashes); the estimate streams the rows
+        # through the same fingerprints and HyperLogLog as the pandas path.
+        rows = len(self)
+        if mode == "estimate":
+            sketch = HyperLogLog()
+            for chunk in self.batches():
+                sketch.add_hashes(row_fingerprints(chunk))
+            distinct = min(rows, sketch.count())
+            error = 2 * sketch.relative_error * distinct / max(1, rows)
+            return rows - distinct, f"estimated ±{error:.1%} at 95%"
+        values = ", ".join(self._value(col) for col in self.columns)
+        if mode == "fingerprint":
+            distinct = self.query(f"SELECT count(DISTINCT hash({values})) FROM source")[0][0]
+            return rows - distinct, f"fingerprinted, ≤{fingerprint_collision_bound(rows):.1g} expected collisions"
+        distinct = self.query(f"SELECT count(*) FROM (SELECT DISTINCT {values} FROM source)")[0][0]
+        return rows - distinct, "exact"
+
+    @instrumented("engine_value_counts", tags=("column",))
+    def value_counts(self, column):
+        # Series.value_counts() of the column, down to the order of tied
+        # counts: values come back in order of first appearance, as pandas'
+        # hash table yields them, and are sorted the same way
+        value = self._value(column)
+        with self._lock:
+            table = self._connect().sql(
+                f"SELECT value, count(*) AS count FROM (SELECT {value} AS value, row_number() OVER () AS row "
+                "FROM source) WHERE value IS NOT NULL GROUP BY value ORDER BY min(row)"
+            ).to_arrow_table()
+        dtype = self.dtypes[column]
+        counts = table.column("count").to_numpy().astype(np.int64)
+        if isinstance(dtype, pd.CategoricalDtype):
+            # categorical value counts list every category, observed or not
+            observed = pd.Series(counts, index=table.column("value").to_pylist())
+            counts = observed.reindex(dtype.categories, fill_value=0).to_numpy()
+            index = pd.CategoricalIndex(dtype.categories, dtype=dtype, name=column)
+        else:
+            values = table.column("value").to_pandas()
+            index = pd.Index(values.astype(dtype) if dtype != object else values.to_numpy(dtype=object),
+                             name=column)
+        return pd.Series(counts, index=index, name="count").sort_values(ascending=False)
+
+    @instrumented("engine_histogram", tags=("column",))
+    def histogram_bins(self, column, nbins, value_range=None):
+        # chart_data.histogram_bins of the column. The bin edges are
+        # np.histogram's for the same range, and a value is counted in the
+        # bin whose edges enclose it, which is where np.histogram puts it.
+        value = f"{self._value(column)}::DOUBLE"
+        finite = f"isfinite({value})"
+        if value_range is None:
+            low, high, count = self.query(f"SELECT min({value}), max({value}), count(*) FROM source WHERE {finite}")[0]
+            if not count:
+                return np.array([]), np.array([]), np.array([], dtype=np.int64)
+            value_range = (low, high)
+        edges = np.histogram_bin_edges(np.array(value_range, dtype=np.float64), bins=nbins, range=value_range)
+        at_least = self.query(
+            "SELECT " + ", ".join(f"count(*) FILTER (WHERE {value} >= ?)" for _ in edges[:-1])
+            + f" FROM source WHERE {finite} AND {value} <= ?",
+            [float(edge) for edge in edges[:-1]] + [float(edges[-1])]
+        )[0]
+        at_least = np.array(at_least, dtype=np.int64)
+        counts = at_least - np.append(at_least[1:], 0)
+        if not counts.sum():
+            return np.array([]), np.array([]), np.array([], dtype=np.int64)
+        return edges[:-1], np.diff(edges), counts
+
+
+def open_table(path):
+    # a DuckDBTable over a data file, or ValueError when DuckDB is missing
+    if importlib.util.find_spec("duckdb") is None:
+        raise ValueError("The DuckDB engine needs the duckdb package (pip install duckdb)")
+    return DuckDBTable(path)
+
+
+def validate_table(path):
+    # is_valid_csv/is_valid_columnar for the DuckDB engine: (status,
+    # message, table), with the file opened and checked without loading
+    # its rows
+    try:
+        table = open_table(path)
+        status, message = validate_columns(table.head(0))
+        if status and not len(table):
+            status, message = False, "File is empty"
+    except Exception as e:
+        return False, f"Invalid file: {e}", None
+    return (True, message, table) if status else (False, message, None)
+
+
+def upload_table(file, file_hash):
+    # An uploaded file as a table. The upload is copied to UPLOAD_DIR once
+    # per content hash and scanned from there; it is never parsed into pandas.
+    path = os.path.join(UPLOAD_DIR, file_hash + os.path.splitext(file.name)[1].lower())
+    if not os.path.exists(path):
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        file.seek(0)
+        with tempfile.NamedTemporaryFile("wb", dir=UPLOAD_DIR, suffix=".partial", delete=False) as f:
+            shutil.copyfileobj(file, f)
+        os.replace(f.name, path)
+        file.seek(0)
+    return validate_table(path)
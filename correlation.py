@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+import chart_data
+from column_stats import select_columns
+from instrumentation import instrumented
+from lazy_imports import LazyModule
+
+# clustering is only needed once a matrix is drawn
+hierarchy = LazyModule("scipy.cluster.hierarchy")
+
+BLOCK_CELLS = 4_000_000       # values per block of rows fed to the matrix products
+DEFAULT_SAMPLE_ROWS = 100_000
+TOP_PAIRS = 20
+MAX_MATRIX_COLUMNS = 40       # columns drawn in the heatmap; wider frames show the strongest pairs'
+ANNOTATE_COLUMNS = 12         # cells are labelled with their value up to this many columns
+
+
+def _blocks(df, columns):
+    # (values, valid) per block of rows, as float64 with missing and
+    # infinite values zeroed; a block holds about BLOCK_CELLS values
+    # whatever the number of columns. Columns are selected per block, so
+    # only one block is ever copied, and blocks are always copies (to_numpy
+    # may return a view of the frame) that callers can modify in place.
+    rows = max(1, BLOCK_CELLS // max(1, len(columns)))
+    for start in range(0, len(df), rows):
+        block = df.iloc[start:start + rows][columns]
+        values = block.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        valid = np.isfinite(values)
+        values[~valid] = 0.0
+        yield values, valid
+
+
+@instrumented("correlation_matrix", tags=("max_rows",))
+def correlation_matrix(df, columns=None, max_rows=None):
+    # Pearson correlations of the numeric columns, like DataFrame.corr():
+    # each pair uses the rows where both values are finite, and a pair
+    # without two such rows or with a constant column is NaN. max_rows
+    # samples the rows first.
+    #
+    # The columns are centred on their means, then the pairwise sums
+    # (rows, x, x², xy) are accumulated as matrix products over blocks of
+    # rows, so memory stays at a few p×p matrices plus one block. The sums
+    # are taken over all rows of a block and the rows a pair does not share
+    # subtracted, which only takes products with the columns missing values.
+    columns = select_columns(df, [np.number]) if columns is None else list(columns)
+    if max_rows:
+        df = chart_data.sample_rows(df, max_rows)
+    p = len(columns)
+
+    count, total = np.zeros(p), np.zeros(p)
+    for values, valid in _blocks(df, columns):
+        count += valid.sum(axis=0)
+        total += values.sum(axis=0)
+    means = np.divide(total, count, out=np.zeros(p), where=count > 0)
+
+    n, sx, sxx, sxy = (np.zeros((p, p)) for _ in range(4))
+    for values, valid in _blocks(df, columns):
+        values -= means
+        values[~valid] = 0.0
+        squares = values * values
+        sxy += values.T @ values
+        n += len(values)
+        sx += values.sum(axis=0)[:, None]
+        sxx += squares.sum(axis=0)[:, None]
+        gaps = ~valid.all(axis=0)
+        if gaps.any():
+            missing = (~valid[:, gaps]).astype(np.float64)
+            misses = missing.sum(axis=0)
+            n[:, gaps] -= misses
+            n[gaps, :] -= misses[:, None]
+            n[np.ix_(gaps, gaps)] += missing.T @ missing
+            sx[:, gaps] -= values.T @ missing
+            sxx[:, gaps] -= squares.T @ missing
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var = sxx - sx * sx / n          # var[i, j]: column i over the rows pair (i, j) shares
+        corr = cov / np.sqrt(var * var.T)
+    corr[(n < 2) | ~(var > 0) | ~(var.T > 0)] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def top_pairs(corr, n=TOP_PAIRS, min_abs=0.0):
+    # The n pairs of distinct columns with the largest |correlation| of at
+    # least min_abs, strongest first, as a frame of the two column names
+    # and the correlation
+    strength = np.abs(np.triu(corr.to_numpy(), k=1))
+    strength[np.tril_indices(len(strength))] = -1.0
+    strength[np.isnan(strength) | (strength < min_abs)] = -1.0
+    flat = strength.ravel()
+    picks = np.flatnonzero(flat >= 0)
+    if len(picks) > n:
+        picks = picks[np.argpartition(-flat[picks], n - 1)[:n]]
+    picks = picks[np.argsort(-flat[picks], kind="stable")]
+    first, second = np.unravel_index(picks, strength.shape)
+    return pd.DataFrame({
+        "Column 1": corr.index[first],
+        "Column 2": corr.columns[second],
+        "Correlation": corr.to_numpy()[first, second],
+    })
+
+
+def cluster_order(corr):
+    # positions of the columns with correlated columns next to each other:
+    # the leaf order of an average-linkage clustering on 1 - |r|
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    distance = 1.0 - np.abs(np.nan_to_num(corr.to_numpy(), nan=0.0))
+    np.fill_diagonal(distance, 0.0)
+    condensed = distance[np.triu_indices(len(distance), k=1)]
+    return hierarchy.leaves_list(hierarchy.linkage(np.clip(condensed, 0.0, None), method="average"))
+
+
+def matrix_view(corr, pairs, min_abs=0.0, max_columns=MAX_MATRIX_COLUMNS):
+    # The part of the matrix worth drawing: every column when there are at
+    # most max_columns, otherwise the columns of the strongest pairs in rank
+    # order, up to max_columns. Rows and columns are in cluster order and
+    # cells below min_abs are NaN (left blank).
+    if len(corr) > max_columns:
+        ranked = pd.unique(pairs[["Column 1", "Column 2"]].to_numpy().ravel())
+        corr = corr.loc[ranked[:max_columns], ranked[:max_columns]]
+    order = cluster_order(corr)
+    view = corr.iloc[order, order]
+    if min_abs > 0:
+        view = view.mask(view.abs() < min_abs)
+    return view
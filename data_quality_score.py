@@ -1,30 +1,76 @@
 import pandas as pd
-import numpy as np
-import streamlit as st
 
+from column_stats import ColumnStatsStore, KLL_K, select_columns
+from instrumentation import instrumented
+from sketches import HyperLogLog, KLLSketch, row_fingerprints, fingerprint_collision_bound
 
-@st.cache_data(ttl=3600, show_spinner="Calculating data quality score...")
-def calculate_score(df):
+DUPLICATE_MODES = {
+    "exact": "Exact (full row comparison)",
+    "fingerprint": "Fingerprint (64-bit row hashes)",
+    "estimate": "Estimate (HyperLogLog)",
+}
+
+
+def count_duplicates(df, mode="exact"):
+    # Returns the duplicate row count and a note on how exact it is
+    if hasattr(df, "count_duplicates"):
+        return df.count_duplicates(mode)      # counted by the table's engine
+    n_rows = df.shape[0]
+    if mode == "fingerprint":
+        duplicates = n_rows - len(pd.unique(row_fingerprints(df)))
+        return duplicates, f"fingerprinted, ≤{fingerprint_collision_bound(n_rows):.1g} expected collisions"
+    if mode == "estimate":
+        sketch = HyperLogLog().add_hashes(row_fingerprints(df))
+        distinct = min(n_rows, sketch.count())
+        error = 2 * sketch.relative_error * distinct / max(1, n_rows)
+        return n_rows - distinct, f"estimated ±{error:.1%} at 95%"
+    return df.duplicated().sum(), "exact"
+
+
+@instrumented("calculate_score", tags=("duplicate_mode",))
+def calculate_score(df, duplicate_mode="exact", progress=None, stats=None, workers=1, backend="thread",
+                    known_duplicates=None):
+    # Null counts, the numeric split and the quartiles behind the outlier
+    # factor come from the dataset's column statistics store, so they are
+    # shared with Quick Insights and the charts instead of recomputed.
+    # workers/backend parallelize the per-column work without changing it.
+    # df may also be a compute_engine table, which pushes the column
+    # statistics and the duplicate count down to its engine.
+    # known_duplicates is a (count, note) pair kept up to date elsewhere, as
+    # an append history does, instead of counting over every row.
+    progress = progress or (lambda fraction, message="": None)
+    stats = stats if stats is not None else ColumnStatsStore()
     total_score = 0
     max_score = 100
     factors = []
+    n_rows, n_cols = df.shape
+
+    progress(0.05, "Column statistics")
+    column_stats = stats.get(df, workers=workers, backend=backend)
+    numeric_stats = [column_stats[col] for col in df.columns if column_stats[col].numeric]
+    numeric_cols = len(numeric_stats)
+    categoric_cols = len(select_columns(df, ['object', 'category', 'string']))
 
     #1.Missing values (25points)
-    missing_percentage = df.isnull().sum().sum()/ (df.shape[0] * df.shape[1])
+    progress(0.1, "Missing values")
+    missing_percentage = sum(col.nulls for col in column_stats.values())/ (n_rows * n_cols)
     missing_score = 25 * (1 - missing_percentage)
     total_score += missing_score
     factors.append(f"Missing values: {missing_score:.1f}/25 ({missing_percentage:.1%} missing)")
 
     #2.Duplicates (15points)
-    duplicate_percentage = df.duplicated().sum()/ df.shape[0]
+    progress(0.2, "Duplicates")
+    if known_duplicates is not None:
+        duplicates, duplicate_note = known_duplicates
+    else:
+        duplicates, duplicate_note = count_duplicates(df, duplicate_mode)
+    duplicate_percentage = duplicates/ n_rows
     duplicate_score = 15*(1 - duplicate_percentage)
     total_score += duplicate_score
-    factors.append(f"Duplicates: {duplicate_score:.1f}/15 ({duplicate_percentage:.1%} duplicates)")
+    factors.append(f"Duplicates: {duplicate_score:.1f}/15 ({duplicate_percentage:.1%} duplicates, {duplicate_note})")
 
     #3.Data types consistency (20points)
-    numeric_cols = df.select_dtypes(include=[np.number]).shape[1]
-    categoric_cols = df.select_dtypes(include=['object', 'category']).shape[1]
-    dtypes_score = 20 * (1- (abs( numeric_cols - categoric_cols) / max(1, df.shape[1])))
+    dtypes_score = 20 * (1- (abs( numeric_cols - categoric_cols) / max(1, n_cols)))
     total_score += dtypes_score
     factors.append(f"Data Types: {dtypes_score:.1f}/20 ({numeric_cols} numeric, {categoric_cols} categorical)")
 
@@ -35,41 +81,43 @@ def calculate_score(df):
     factors.append(f"Column Names: {naming_score:.1f}/10 ({invalid_chars} columns with special chars)")
 
     #5.Data Volume (15points)
-    volume_score = min(15, (df.shape[0] * df.shape[1])/1000)
+    volume_score = min(15, (n_rows * n_cols)/1000)
     total_score += volume_score
-    factors.append(f"Data Volume: {volume_score:.1f}/15 ({df.shape[0]} rows × {df.shape[1]} columns)")
+    factors.append(f"Data Volume: {volume_score:.1f}/15 ({n_rows} rows × {n_cols} columns)")
 
     #6.Outliers (15points)
-    numeric_cols_count = df.select_dtypes(include=[np.number]).shape[1]
-    if numeric_cols_count > 0:
+    progress(0.6, "Outliers")
+    if numeric_cols > 0:
         outlier_scores = []
-        numeric_df = df.select_dtypes(include=[np.number])
-        for col in numeric_df.columns:
-            if numeric_df[col].notna().sum() > 0:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-
-                if IQR > 0:
-                    outliers = ((df[col] < (Q1 - 1.5 * IQR)) | (df[col] > (Q3 + 1.5 * IQR))).sum()
-                    outlier_percentage = outliers / df.shape[0]
+        for col in numeric_stats:
+            if col.count:
+                if col.quantiles[0.75] - col.quantiles[0.25] > 0:
+                    outlier_percentage = col.outliers / n_rows
                     outlier_scores.append(1 - outlier_percentage)
                 else:
                     outlier_scores.append(1.0)
         if outlier_scores:
             outlier_score = 15 * (sum(outlier_scores) / len(outlier_scores))
             total_score += outlier_score
-            factors.append(f"Outliers: {outlier_score:.1f}/15 (numeric columns analysis)")
+            note = f", quartiles ±{KLLSketch(KLL_K).rank_error:.1%} rank" if stats.approximate else ""
+            factors.append(f"Outliers: {outlier_score:.1f}/15 (numeric columns analysis{note})")
         else:
             factors.append("Outliers: N/A (no valid numeric columns for analysis)")
     else:
         factors.append("Outliers: N/A (no numeric columns)")
 
     total_score = max(0 , min(100, total_score))
+    progress(1.0, "Done")
 
     return total_score, factors
 
-@st.cache_data(ttl=3600)
+
+def score_with_stats(df, duplicate_mode="exact", stats=None, workers=1, backend="thread", progress=None):
+    # Job entry point: the worker fills its copy of the store, and the
+    # computed columns travel back to be merged into the parent's store
+    stats = stats if stats is not None else ColumnStatsStore()
+    return calculate_score(df, duplicate_mode, progress, stats, workers, backend), stats.columns
+
 def get_quality_emoji(score):
     if score >= 90:
         return "🎯 Excellent"
@@ -83,6 +131,7 @@ def get_quality_emoji(score):
         return "❌ Poor"
     
 def display_quality_score(score, factors):
+    import streamlit as st
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
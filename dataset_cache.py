@@ -0,0 +1,188 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import get_store
+from instrumentation import get_recorder
+
+MAX_CACHE_BYTES = 2 * 1024**3     # memory cap shared by frames and results
+
+_MISSING = object()
+
+
+def estimate_size(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "to_plotly_json"):
+        # Plotly figures and traces: the arrays their traces hold, nested
+        # properties (marker colours, hover text) included. Trace properties
+        # are read in place; to_plotly_json would deep-copy them.
+        traces = obj.data if hasattr(obj, "data") else [obj]
+        return sys.getsizeof(obj) + sum(estimate_size(trace._props) for trace in traces)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def freeze_params(params):
+    if isinstance(params, dict):
+        return tuple(sorted((k, freeze_params(v)) for k, v in params.items()))
+    if isinstance(params, (list, tuple, set)):
+        return tuple(freeze_params(v) for v in params)
+    return params
+
+
+class DatasetRegistry:
+    # Holds parsed frames and analysis results keyed by the upload's content
+    # hash, so lookups never hash the data itself. Frames and results share one
+    # LRU ordering and one byte budget; evicted frames are spilled to the
+    # columnar DatasetStore when one is given and memory-mapped back on the
+    # next lookup. Cached objects are shared between sessions and must not be
+    # mutated. Lookups are counted per operation under the registry's name.
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, store=None, name="datasets"):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()    # key -> (value, size)
+        self._bytes = 0
+        self._spilling = {}           # dataset hash -> evicted frame being written to the store
+        self._lock = threading.RLock()
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def _put(self, key, value, size=None):
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            spilled = self._evict(keep=key)
+        self._spill(spilled)
+
+    def _evict(self, keep):
+        # evicted frames to spill, as (dataset_hash, frame); they are written
+        # by _spill once the lock is released, so lookups in other sessions
+        # never wait on the disk
+        spilled = []
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            value, size = self._entries.pop(key)
+            self._bytes -= size
+            if key[1] == "frame" and self.store is not None:
+                self._spilling[key[0]] = value
+                spilled.append((key[0], value))
+        return spilled
+
+    def _spill(self, spilled):
+        # until written, a spilled frame is still served from memory
+        for dataset_hash, df in spilled:
+            try:
+                self.store.save(dataset_hash, df)
+            finally:
+                with self._lock:
+                    if self._spilling.get(dataset_hash) is df:
+                        del self._spilling[dataset_hash]
+
+    def resize(self, dataset_hash, operation, params=None):
+        # measures a cached value again after it grew in place (e.g. a
+        # ColumnStatsStore cached empty and filled as columns are asked for)
+        key = (dataset_hash, operation, freeze_params(params or {}))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        size = estimate_size(entry[0])
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or current[0] is not entry[0]:
+                return
+            self._bytes += size - current[1]
+            self._entries[key] = (current[0], size)
+            spilled = self._evict(keep=key)
+        self._spill(spilled)
+
+    def _lookup(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                get_recorder().count_cache(self.name, key[1], hit=False)
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            get_recorder().count_cache(self.name, key[1], hit=True)
+            return entry[0]
+
+    def put_frame(self, dataset_hash, df, size=None):
+        # size: the frame's bytes when already known, e.g. for a frame
+        # assembled from registered parts; measuring object columns is O(rows)
+        self._put((dataset_hash, "frame", ()), df, size)
+
+    def frame_size(self, dataset_hash):
+        # bytes accounted for a frame held in memory, else None
+        with self._lock:
+            entry = self._entries.get((dataset_hash, "frame", ()))
+            return entry[1] if entry is not None else None
+
+    def get_frame(self, dataset_hash):
+        df = self._lookup((dataset_hash, "frame", ()))
+        if df is None:
+            with self._lock:
+                df = self._spilling.get(dataset_hash)
+        if df is None and self.store is not None:
+            stored = self.store.has(dataset_hash)
+            get_recorder().count_cache("store", "frame", hit=stored)
+            if stored:
+                df = self.store.load(dataset_hash)
+                self.put_frame(dataset_hash, df)
+        return df
+
+    def put_result(self, dataset_hash, operation, params, value):
+        self._put((dataset_hash, operation, freeze_params(params)), value)
+
+    def get_result(self, dataset_hash, operation, params=None):
+        return self._lookup((dataset_hash, operation, freeze_params(params or {})))
+
+    def cached(self, dataset_hash, operation, params, compute, *args, **kwargs):
+        key = (dataset_hash, operation, freeze_params(params or {}))
+        value = self._lookup(key, _MISSING)
+        if value is _MISSING:
+            value = compute(*args, **kwargs)
+            self._put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._spilling.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    # One registry per server process, shared by every Streamlit session
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasetRegistry(store=get_store())
+        return _registry
@@ -0,0 +1,85 @@
+import os
+
+import pyarrow.feather as feather
+
+from artifact_store import atomic_write
+
+STORE_DIR = os.path.join(".cache", "store")
+MAX_STORE_BYTES = 20 * 1024**3    # least recently used datasets are removed past this
+
+
+class DatasetStore:
+    # Parsed datasets kept on disk as uncompressed Arrow IPC (Feather v2) files
+    # named by content hash. Uncompressed files can be memory-mapped, so a
+    # reload maps the file instead of parsing it. Each file is one record
+    # batch, so numeric columns without nulls load as read-only views of the
+    # mapping and their pages are only read once an analysis touches them;
+    # load(columns=) skips the other columns altogether. Files are used in
+    # LRU order (a load refreshes the file's mtime), and saving prunes the
+    # least recently used ones past max_bytes.
+    def __init__(self, root=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, dataset_hash):
+        return os.path.join(self.root, f"{dataset_hash}.feather")
+
+    def has(self, dataset_hash):
+        return os.path.exists(self.path(dataset_hash))
+
+    def save(self, dataset_hash, df):
+        path = self.path(dataset_hash)
+        if os.path.exists(path):
+            return True
+        # a temporary file of its own per save, so sessions or workers saving
+        # the same dataset at once never write into each other's file
+        try:
+            with atomic_write(path) as partial_path:
+                feather.write_feather(df, partial_path, compression="uncompressed", chunksize=max(1, len(df)))
+        except Exception:
+            # columns pyarrow cannot type (e.g. mixed ints and strings) keep
+            # the dataset out of the store; it is simply parsed again next time
+            return False
+        self.prune(keep=path)
+        return True
+
+    def load(self, dataset_hash, columns=None):
+        path = self.path(dataset_hash)
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        try:
+            os.utime(path)
+        except OSError:
+            pass                          # e.g. a file saved by another user
+        return table.to_pandas(split_blocks=True)
+
+    def prune(self, keep=None):
+        # removes the least recently used files until the store fits in
+        # max_bytes. Processes that mapped a removed file keep reading it.
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".feather") and entry.path != keep:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files) + (os.path.getsize(keep) if keep else 0)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass                      # pruned by another process
+            total -= size
+
+    def remove(self, dataset_hash):
+        if self.has(dataset_hash):
+            os.remove(self.path(dataset_hash))
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = DatasetStore()
+    return _store
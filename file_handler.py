@@ -1,44 +1,293 @@
+import os
+import numpy as np
 import pandas as pd
 import hashlib
-import streamlit as st
 
+from instrumentation import instrumented
+
+CHUNK_SIZE = 100_000              # rows parsed per chunk in streaming mode
+HASH_BLOCK_SIZE = 1024 * 1024     # bytes read per step when hashing
+CATEGORY_MAX_RATIO = 0.5          # max distinct/rows share for an object column to become category
+
+
+@instrumented("get_file_hash", result_attributes=lambda file_hash: {"dataset_hash": file_hash})
 def get_file_hash(file):
     file.seek(0)
-    content = file.read()
+    md5 = hashlib.md5()
+    while True:
+        block = file.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        md5.update(block)
+    file.seek(0)
+    return md5.hexdigest()
+
+
+def get_file_size(file):
+    size = getattr(file, "size", None)
+    if size is not None:
+        return size
+    position = file.tell()
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+class _HashingReader:
+    # Wraps a binary file object so that every byte pandas pulls through it is
+    # hashed and counted, giving a content hash and real progress in one pass.
+    # With hashing=False (the hash is already known) bytes are only counted.
+    def __init__(self, file, total_size=None, progress_callback=None, hashing=True):
+        self._file = file
+        self._md5 = hashlib.md5() if hashing else None
+        self.bytes_read = 0
+        self.total_size = total_size
+        self._progress_callback = progress_callback
+
+    def _consume(self, block):
+        if self._md5 is not None:
+            self._md5.update(block)
+        self.bytes_read += len(block)
+        if self._progress_callback is not None:
+            self._progress_callback(self.bytes_read, self.total_size)
+        return block
+
+    def read(self, size=-1):
+        return self._consume(self._file.read(size))
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def readinto(self, buffer):
+        block = self.read(len(buffer))
+        buffer[:len(block)] = block
+        return len(block)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def writable(self):
+        return False
+
+    @property
+    def closed(self):
+        return False
+
+    def close(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def readline(self, size=-1):
+        return self._consume(self._file.readline(size))
+
+    def hexdigest(self):
+        return self._md5.hexdigest()
+
+
+def downcast_float(series):
+    # float32 only when every value survives the round trip, so scores and
+    # quantiles computed on the compact frame stay identical
+    narrow = series.astype("float32")
+    if ((narrow.astype("float64") == series) | series.isna()).all():
+        return narrow
+    return series
+
+
+def compact_dtypes(df, category_ratio=CATEGORY_MAX_RATIO, arrow_strings=False):
+    bytes_before = df.memory_usage(deep=True, index=False)
+    dtypes_before = df.dtypes.astype(str)
+    compact = {}
+
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            compact[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            compact[col] = downcast_float(series)
+        elif pd.api.types.is_object_dtype(series):
+            non_null = series.notna().sum()
+            if non_null and series.nunique(dropna=True) / non_null <= category_ratio:
+                compact[col] = series.astype("category")
+            elif arrow_strings and pd.api.types.infer_dtype(series, skipna=True) == "string":
+                try:
+                    compact[col] = series.astype("string[pyarrow]")
+                except ImportError:
+                    pass
+
+    if compact:
+        df = df.assign(**compact)
+
+    bytes_after = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "dtype_before": dtypes_before,
+        "dtype_after": df.dtypes.astype(str),
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+    })
+    return df, report
+
+
+def validate_columns(df):
+    if df.shape[1] < 1:
+        return False, "The file has no valid data"
+
+    if any(col is None or str(col).strip() == "" for col in df.columns):
+        return False, "CSV file has missing/invalid column names"
+
+    return True, "File is valid"
+
+
+def _all_null(values):
+    return bool(pd.isna(values).all())
+
+
+def _value_kind(values):
+    if values.dtype.kind in "iuf":
+        return "number"
+    if values.dtype.kind == "b" or pd.api.types.infer_dtype(values, skipna=True) == "boolean":
+        return "bool"
+    return "text"
+
+
+def _combine_column(parts):
+    # A column from its chunks, typed as a single pass over the whole file
+    # (low_memory=False) would type it: numbers widen to float, and chunks
+    # that are entirely null or hold booleans with gaps make an object
+    # column. Returns None when the chunks mix numbers, booleans and text,
+    # which a whole-file pass reads as the original text.
+    dtypes = {values.dtype for values in parts}
+    if len(dtypes) == 1 or all(dtype.kind in "iuf" for dtype in dtypes):
+        return np.concatenate(parts)
+    if len({_value_kind(values) for values in parts if not _all_null(values)}) > 1:
+        return None
+    return np.concatenate([values.astype(object) for values in parts])
+
+
+@instrumented("read_csv_streaming", tags=("chunksize",),
+              result_attributes=lambda result: {"dataset_hash": result[3]})
+def read_csv_streaming(file, chunksize=CHUNK_SIZE, progress_callback=None, file_hash=None):
+    # Parses the upload chunk by chunk. The header and first chunk are validated
+    # before the rest of the file is touched, so a bad file is rejected after
+    # reading at most one chunk. Returns (status, message, df, file_hash); the
+    # content is hashed while parsing unless file_hash is given.
+    #
+    # Each chunk's columns are copied out of it as it is parsed, and the
+    # frame is assembled column by column, freeing each column's chunks as
+    # it goes: peak memory is the frame plus one chunk, not the chunks plus
+    # their concatenation. Columns whose chunks were typed differently are
+    # combined as a whole-file parse would have typed them; a column mixing
+    # numbers and text is read again as text, the only extra pass.
+    file.seek(0)
+    reader = _HashingReader(file, get_file_size(file), progress_callback, hashing=file_hash is None)
+
+    names, parts = None, None
+    # floats are parsed correctly rounded (pandas' default parser can be off
+    # by an ulp), so values and row fingerprints match the DuckDB engine's
+    with pd.read_csv(reader, encoding="utf-8", chunksize=chunksize, low_memory=False,
+                     float_precision="round_trip") as csv_chunks:
+        for chunk in csv_chunks:
+            if parts is None:
+                status, message = validate_columns(chunk)
+                if not status:
+                    file.seek(0)
+                    return False, message, None, None
+                names = chunk.columns
+                parts = [[] for _ in names]
+            for position, column in enumerate(parts):
+                column.append(chunk.iloc[:, position].to_numpy(copy=True))
+
+    if parts is None:
+        file.seek(0)
+        return False, "CSV file is empty", None, None
+
+    columns = {}
+    for position in range(len(names)):
+        values = _combine_column(parts[position])
+        parts[position] = None
+        if values is None:
+            file.seek(0)
+            values = pd.read_csv(file, encoding="utf-8", usecols=[position], dtype=str).iloc[:, 0].to_numpy()
+        columns[position] = values
     file.seek(0)
-    return hashlib.md5(content).hexdigest()
 
-@st.cache_data(ttl=3600)
-def read_csv_file(file_path_or_object):
-    return pd.read_csv(file_path_or_object, encoding="utf-8", low_memory=False)
+    # one block per column: building the frame does not copy the columns
+    df = pd.DataFrame(columns, copy=False)
+    df.columns = names
+    return True, "File is valid", df, file_hash or reader.hexdigest()
 
 
-def is_valid_csv(file) -> (bool, str, pd.DataFrame | None):
+@instrumented("is_valid_csv", result_attributes=lambda result: {"dataset_hash": result[3]})
+def is_valid_csv(file, progress_callback=None, chunksize=CHUNK_SIZE, file_hash=None) -> (bool, str, pd.DataFrame | None, str | None):
     try:
-        
-        file_hash = get_file_hash(file)
 
-        df = read_csv_file(file)
+        status, message, df, file_hash = read_csv_streaming(file, chunksize, progress_callback, file_hash)
+
+        if not status:
+            return False, message, None, None
 
         if df.empty:
-            return False, "CSV file is empty", None
+            return False, "CSV file is empty", None, None
 
         if df.shape[0] < 1 or df.shape[1] < 1:
-            return False, "The file has no valid data", None
+            return False, "The file has no valid data", None, None
 
-        if any(col is None or str(col).strip() == "" for col in df.columns):
-            return False, "CSV file has missing/invalid column names", None
-
-        return True, "File is valid", df
+        return True, "File is valid", df, file_hash
 
     except UnicodeDecodeError:
-        return False, "Encoding error: Try saving as UTF-8", None
+        return False, "Encoding error: Try saving as UTF-8", None, None
 
     except pd.errors.EmptyDataError:
-        return False, "CSV file has no data", None
+        return False, "CSV file has no data", None, None
 
     except pd.errors.ParserError:
-        return False, "Parsing error: Check delimiters or corrupted file", None
+        return False, "Parsing error: Check delimiters or corrupted file", None, None
+
+    except Exception as e:
+        return False, f"Invalid CSV file: {str(e)}", None, None
+
+
+COLUMNAR_READERS = {
+    ".parquet": pd.read_parquet,
+    ".feather": pd.read_feather,
+}
+
+
+def is_columnar_file(file):
+    return os.path.splitext(getattr(file, "name", ""))[1].lower() in COLUMNAR_READERS
+
+
+@instrumented("is_valid_columnar", result_attributes=lambda result: {"dataset_hash": result[3]})
+def is_valid_columnar(file, progress_callback=None, file_hash=None) -> (bool, str, pd.DataFrame | None, str | None):
+    try:
+
+        file_hash = file_hash or get_file_hash(file)
+        reader = COLUMNAR_READERS[os.path.splitext(file.name)[1].lower()]
+        df = reader(file)
+        file.seek(0)
+        if progress_callback is not None:
+            size = get_file_size(file)
+            progress_callback(size, size)
+
+        status, message = validate_columns(df)
+        if not status:
+            return False, message, None, None
+
+        if df.empty:
+            return False, "File is empty", None, None
+
+        return True, "File is valid", df, file_hash
 
     except Exception as e:
-        return False, f"Invalid CSV file: {str(e)}", None
+        return False, f"Invalid columnar file: {str(e)}", None, None
@@ -0,0 +1,242 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import resource
+import threading
+import time
+from collections import Counter, deque
+
+import pandas as pd
+
+MAX_SPANS = 2_000             # finished spans kept in memory per process
+METRICS_DIR = os.path.join(".cache", "metrics")
+RECENT_SPANS = 20             # spans listed individually in the Performance panel
+RECENT_COLUMNS = ["name", "duration_s", "rss_delta_mb", "status", "dataset_hash", "rows", "cols"]
+
+# set once per script run, read by every span started in that run
+_context = contextvars.ContextVar("instrumentation_context", default={})
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # no procfs: fall back to the process high-water mark
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def set_context(**attributes):
+    # e.g. set_context(session="...", dataset_hash="...", rows=..., cols=...)
+    _context.set({key: value for key, value in attributes.items() if value is not None})
+
+
+class SpanRecorder:
+    # Finished spans and cache counters of this process. Spans recorded in a
+    # job worker are collected there and replayed here by the job runner.
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.cache = Counter()        # (cache, operation, "hit"/"miss") -> count
+        self._collectors = []
+        self._exported = 0            # spans written to the metrics file so far
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            self._total += 1
+            for collected in self._collectors:
+                collected.append(span)
+
+    def count_cache(self, cache, operation, hit):
+        with self._lock:
+            self.cache[(cache, operation, "hit" if hit else "miss")] += 1
+
+    def collect(self):
+        # list receiving every span recorded until stop_collecting
+        collected = []
+        with self._lock:
+            self._collectors.append(collected)
+        return collected
+
+    def stop_collecting(self, collected):
+        with self._lock:
+            self._collectors.remove(collected)
+
+    def session_spans(self, session):
+        with self._lock:
+            return [span for span in self.spans if span.get("session") == session]
+
+    def summary(self, spans):
+        # per span name: count, total and slowest duration, memory growth
+        if not spans:
+            return pd.DataFrame(columns=["calls", "total_s", "max_s", "rss_delta_mb"])
+        frame = pd.DataFrame(spans)
+        return frame.groupby("name").agg(
+            calls=("duration_s", "size"),
+            total_s=("duration_s", "sum"),
+            max_s=("duration_s", "max"),
+            rss_delta_mb=("rss_delta_mb", "sum"),
+        ).sort_values("total_s", ascending=False)
+
+    def cache_table(self):
+        with self._lock:
+            counts = dict(self.cache)
+        rows = {}
+        for (cache, operation, outcome), count in counts.items():
+            row = rows.setdefault((cache, operation), {"cache": cache, "operation": operation, "hits": 0, "misses": 0})
+            row["hits" if outcome == "hit" else "misses"] = count
+        return pd.DataFrame([rows[key] for key in sorted(rows)], columns=["cache", "operation", "hits", "misses"])
+
+    def prometheus_text(self):
+        # Prometheus text exposition format, e.g. for node_exporter's
+        # textfile collector
+        with self._lock:
+            spans = list(self.spans)
+            cache = dict(self.cache)
+        lines = [
+            "# HELP insights_span_seconds Time spent in instrumented operations",
+            "# TYPE insights_span_seconds summary",
+        ]
+        if spans:
+            totals = pd.DataFrame(spans).groupby("name")["duration_s"].agg(["sum", "count"])
+            for name, row in totals.iterrows():
+                lines.append(f'insights_span_seconds_sum{{name="{name}"}} {row["sum"]:.6f}')
+                lines.append(f'insights_span_seconds_count{{name="{name}"}} {int(row["count"])}')
+        lines += [
+            "# HELP insights_cache_lookups_total Cache lookups by outcome",
+            "# TYPE insights_cache_lookups_total counter",
+        ]
+        for (cache_name, operation, outcome), count in sorted(cache.items()):
+            lines.append(
+                f'insights_cache_lookups_total{{cache="{cache_name}",operation="{operation}",outcome="{outcome}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=METRICS_DIR):
+        # appends new spans to spans.jsonl and rewrites insights.prom
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            unexported = min(len(self.spans), self._total - self._exported)
+            new = list(self.spans)[len(self.spans) - unexported:]
+            self._exported = self._total
+        with open(os.path.join(directory, "spans.jsonl"), "a") as f:
+            for span in new:
+                f.write(json.dumps(span, default=str) + "\n")
+        path = os.path.join(directory, "insights.prom")
+        with open(f"{path}.partial", "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(f"{path}.partial", path)
+        return directory
+
+
+_recorder = SpanRecorder()
+
+
+def get_recorder():
+    return _recorder
+
+
+class span:
+    # Times a block and records its wall time and RSS growth, tagged with the
+    # run's context (session, dataset hash and shape) plus any attributes
+    # given here or added through the returned dict.
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._rss = rss_bytes()
+        return self.attributes
+
+    def __exit__(self, exc_type, exc, tb):
+        _recorder.record({
+            "name": self.name,
+            "time": time.time(),
+            "duration_s": time.perf_counter() - self._start,
+            "rss_delta_mb": (rss_bytes() - self._rss) / 1024**2,
+            "status": "error" if exc_type is not None else "ok",
+            "pid": os.getpid(),
+            **_context.get(),
+            **self.attributes,
+        })
+        return False
+
+
+def _frame_shape(values):
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            return {"rows": value.shape[0], "cols": value.shape[1]}
+    return {}
+
+
+def instrumented(name, tags=(), result_attributes=None):
+    # Decorator recording a span per call. The span carries the shape of the
+    # first DataFrame argument (or of a DataFrame result, for loaders), the
+    # arguments named in tags, and result_attributes(result) if given, e.g.
+    # the hash of a freshly parsed upload.
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as attributes:
+                attributes.update(_frame_shape(list(args) + list(kwargs.values())))
+                if tags:
+                    bound = signature.bind(*args, **kwargs)
+                    attributes.update({tag: bound.arguments[tag] for tag in tags if tag in bound.arguments})
+                result = fn(*args, **kwargs)
+                if "rows" not in attributes:
+                    attributes.update(_frame_shape(result if isinstance(result, tuple) else [result]))
+                if result_attributes is not None:
+                    attributes.update({key: value for key, value in result_attributes(result).items()
+                                       if value is not None})
+                return result
+        return wrapper
+    return decorator
+
+
+def current_context():
+    return dict(_context.get())
+
+
+def run_collecting(context, fn, *args, **kwargs):
+    # Runs fn under the given context and returns (result, spans recorded
+    # meanwhile), for work done in another process
+    _context.set(context)
+    collected = _recorder.collect()
+    try:
+        return fn(*args, **kwargs), collected
+    finally:
+        _recorder.stop_collecting(collected)
+
+
+def performance_panel():
+    # Sidebar panel with this session's spans and the process' cache counters
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Performance"):
+        ctx = _context.get()
+        spans = _recorder.session_spans(ctx.get("session"))
+        if not spans:
+            st.caption("No instrumented operations in this session yet.")
+        else:
+            st.dataframe(_recorder.summary(spans).round(3))
+            st.write("Recent operations")
+            recent = pd.DataFrame(spans[-RECENT_SPANS:][::-1])
+            st.dataframe(recent.reindex(columns=RECENT_COLUMNS).round(3), hide_index=True)
+        cache = _recorder.cache_table()
+        if len(cache):
+            st.write("Cache lookups")
+            st.dataframe(cache, hide_index=True)
+        every_run = st.checkbox(
+            "Export after every run", key="export_metrics_every_run",
+            help=f"Appends spans to spans.jsonl and rewrites the Prometheus text file insights.prom in {METRICS_DIR}"
+        )
+        if st.button("Export metrics", key="export_metrics") or every_run:
+            directory = _recorder.export()
+            st.caption(f"Metrics written to {directory}")
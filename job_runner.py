@@ -0,0 +1,228 @@
+import hashlib
+import inspect
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dataset_cache import freeze_params
+from dataset_store import get_store
+from instrumentation import current_context, get_recorder, run_collecting
+
+MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+MAX_FINISHED_JOBS = 64        # finished jobs kept around for late pollers
+POLL_INTERVAL = 0.5           # seconds between status refreshes in the UI
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ProgressReporter:
+    # Picklable handle passed to a job as its `progress` argument. Calling it
+    # publishes progress to the parent process and raises JobCancelled once the
+    # job has been cancelled, so long tasks stop at their next checkpoint.
+    def __init__(self, job_id, progress, cancelled):
+        self._job_id = job_id
+        self._progress = progress
+        self._cancelled = cancelled
+
+    def __call__(self, fraction, message=""):
+        if self._cancelled.get(self._job_id):
+            raise JobCancelled(message)
+        self._progress[self._job_id] = (float(fraction), message)
+
+
+class StoredFrame:
+    # Stands in for a dataset's frame in a job's arguments: only the hash is
+    # pickled, and the worker memory-maps the frame from the DatasetStore.
+    def __init__(self, dataset_hash):
+        self.dataset_hash = dataset_hash
+
+    def load(self):
+        return get_store().load(self.dataset_hash)
+
+
+def stored_frame(dataset_hash, df):
+    # What to pass a job for the dataset's frame: a StoredFrame once the
+    # frame is in the store (it is saved on first use), else the frame
+    # itself, e.g. when pyarrow cannot type a column or df is an engine table
+    if not isinstance(df, pd.DataFrame):
+        return df
+    return StoredFrame(dataset_hash) if get_store().save(dataset_hash, df) else df
+
+
+def _resolve(value):
+    return value.load() if isinstance(value, StoredFrame) else value
+
+
+def _run_job(fn, args, kwargs, context):
+    # spans recorded in the worker travel back with the result, tagged with
+    # the submitting session's context
+    args = [_resolve(value) for value in args]
+    kwargs = {key: _resolve(value) for key, value in kwargs.items()}
+    return run_collecting(context, fn, *args, **kwargs)
+
+
+def _reusable(future):
+    # pending, running and successful jobs are shared; failed or cancelled
+    # ones are resubmitted
+    if not future.done():
+        return True
+    return not future.cancelled() and future.exception() is None
+
+
+def job_id_for(dataset_hash, operation, params):
+    key = repr((dataset_hash, operation, freeze_params(params or {})))
+    return hashlib.md5(key.encode()).hexdigest()[:16]
+
+
+class JobRunner:
+    # Runs analysis tasks in a process pool, off the Streamlit script thread.
+    # Jobs are keyed by (dataset_hash, operation, params): submitting a job that
+    # is already queued, running or finished returns the existing job id, so
+    # reruns and other sessions share one computation. Arguments are pickled
+    # to the worker, which keeps this for whole-frame tasks, not per-cell work;
+    # a dataset's frame is passed as stored_frame(hash, df) so that only its
+    # hash is.
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+        self._jobs = OrderedDict()    # job_id -> future
+        self._replayed = set()        # jobs whose worker spans were recorded here
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._executor is None:
+            self._manager = self._context.Manager()
+            self._progress = self._manager.dict()
+            self._cancelled = self._manager.dict()
+            # workers are not warmed up: most jobs never profile, and
+            # generate_eda imports the profiling backend on first use
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=self._context)
+
+    def _prune(self):
+        finished = [job_id for job_id, future in self._jobs.items() if future.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self._forget(job_id)
+
+    def _forget(self, job_id):
+        self._jobs.pop(job_id, None)
+        self._replayed.discard(job_id)
+        self._progress.pop(job_id, None)
+        self._cancelled.pop(job_id, None)
+
+    def submit(self, dataset_hash, operation, params, fn, *args, **kwargs):
+        job_id = job_id_for(dataset_hash, operation, params)
+        with self._lock:
+            self._start()
+            future = self._jobs.get(job_id)
+            if future is not None and _reusable(future):
+                return job_id
+
+            self._forget(job_id)
+            self._prune()
+            if "progress" in inspect.signature(fn).parameters:
+                kwargs["progress"] = ProgressReporter(job_id, self._progress, self._cancelled)
+            self._progress[job_id] = (0.0, "Queued")
+            self._jobs[job_id] = self._executor.submit(_run_job, fn, args, kwargs, current_context())
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            future = self._jobs.get(job_id)
+            if future is None:
+                return {"state": "unknown", "progress": 0.0, "message": "", "error": None}
+            fraction, message = self._progress.get(job_id, (0.0, ""))
+
+        if future.cancelled():
+            state, error = "cancelled", None
+        elif future.done():
+            error = future.exception()
+            if isinstance(error, JobCancelled):
+                state, error = "cancelled", None
+            else:
+                state = "failed" if error is not None else "done"
+            if state == "done":
+                self._replay_spans(job_id, future.result()[1])
+        elif self._cancelled.get(job_id):
+            state, error = "cancelling", None
+        else:
+            state, error = ("running" if future.running() else "queued"), None
+        return {"state": state, "progress": fraction, "message": message, "error": error}
+
+    def _replay_spans(self, job_id, spans):
+        # once per job, however many sessions poll it
+        with self._lock:
+            if job_id in self._replayed:
+                return
+            self._replayed.add(job_id)
+        for span in spans:
+            get_recorder().record(span)
+
+    def result(self, job_id):
+        value, spans = self._jobs[job_id].result()
+        self._replay_spans(job_id, spans)
+        return value
+
+    def cancel(self, job_id):
+        with self._lock:
+            future = self._jobs.get(job_id)
+            if future is None or future.done():
+                return
+            if not future.cancel():
+                self._cancelled[job_id] = True
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._manager.shutdown()
+                self._executor = None
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    # One runner per server process, shared by every Streamlit session
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
+
+
+def poll_job(job_id, label):
+    # Shows progress for a submitted job and returns its status. While a job is
+    # unfinished the script is scheduled to rerun at the end of the page (see
+    # rerun_while_polling) so the rest of the page still renders.
+    import streamlit as st
+
+    runner = get_runner()
+    status = runner.status(job_id)
+    if status["state"] in ("queued", "running", "cancelling"):
+        col1, col2 = st.columns([4, 1])
+        text = f"⏳ {label}: {status['message'] or status['state']}"
+        col1.progress(min(1.0, max(0.0, status["progress"])), text=text)
+        if col2.button("Cancel", key=f"cancel_{job_id}", disabled=status["state"] == "cancelling"):
+            runner.cancel(job_id)
+        st.session_state.job_polling = True
+    return status
+
+
+def rerun_while_polling():
+    import streamlit as st
+
+    if st.session_state.pop("job_polling", False):
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
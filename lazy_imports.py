@@ -0,0 +1,63 @@
+import importlib
+import sys
+import threading
+
+from instrumentation import span
+
+# heavy backends only needed once a section is used; preloading them after
+# the first page is served hides their import time. Charts are drawn in the
+# server process; batch workers preload the profiling backend when the run
+# includes EDA reports.
+WARM_UP_MODULES = ("plotly.express",)
+WORKER_WARM_UP_MODULES = ("ydata_profiling",)
+
+_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def load(name):
+    # importlib.import_module with the first import of a module timed as a
+    # span. A module in sys.modules may still be initializing on the warm-up
+    # thread; import_module then waits for it instead of returning it half done.
+    if name in sys.modules:
+        return importlib.import_module(name)
+    with span("import", module=name):
+        return importlib.import_module(name)
+
+
+class LazyModule:
+    # Stands in for a module until one of its attributes is used, e.g.
+    # px = LazyModule("plotly.express"); px.bar(...) imports plotly on the
+    # first chart instead of at startup.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = load(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None or self._name in sys.modules else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def _import_all(names):
+    for name in names:
+        try:
+            load(name)
+        except ImportError:
+            pass                  # an optional backend that is not installed
+
+
+def warm_up(names=WARM_UP_MODULES):
+    # Imports the modules on a daemon thread, once per process. Sections used
+    # before it finishes simply wait on Python's per-module import lock.
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_import_all, args=(tuple(names),),
+                                               name="warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
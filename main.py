@@ -1,12 +1,28 @@
+import os
+import uuid
+
 import streamlit as st
 import pandas as pd
-import time
 
-from file_handler import is_valid_csv
+from file_handler import is_valid_csv, is_valid_columnar, is_columnar_file, compact_dtypes, get_file_hash
+from append_history import append_rows, appended_hash
+from column_stats import get_column_stats, STATISTICS_MODES
+from compute_engine import COMPUTE_ENGINES, SAMPLE_ROWS, available_engines, upload_table
+from dataset_cache import get_registry
+from dataset_store import get_store
+from instrumentation import set_context, performance_panel
+from job_runner import get_runner, poll_job, rerun_while_polling, stored_frame
+from lazy_imports import warm_up
 from analysis.quick_insights import display_insights
-from analysis.auto_eda import generate_eda
+from analysis.auto_eda import (
+    generate_eda, eda_settings, report_sections, stratification_columns,
+    report_path as eda_report_path, EDA_MODES, DEFAULT_ROW_BUDGET
+)
+from artifact_store import get_store as get_artifact_store
 from visualization import visualize_columns
-from data_quality_score import calculate_score,display_quality_score
+from chart_data import MAX_POINTS
+from parallel import DEFAULT_WORKERS, PARALLEL_BACKENDS
+from data_quality_score import score_with_stats, display_quality_score, DUPLICATE_MODES
 
 st.set_page_config(page_title="Insights Service", layout="centered")
 
@@ -20,6 +36,15 @@ if "uploaded_file" not in st.session_state:
 if "df"  not in st.session_state:
     st.session_state.df= None
 
+if "file_hash" not in st.session_state:
+    st.session_state.file_hash = None
+
+if "table" not in st.session_state:
+    st.session_state.table = None
+
+if "load_attempt" not in st.session_state:
+    st.session_state.load_attempt = None
+
 if "show_preview" not in st.session_state:
     st.session_state.show_preview = False
 
@@ -29,60 +54,258 @@ if "quality_score" not in st.session_state:
 if "quality_factors" not in st.session_state:
     st.session_state.quality_factors = None
 
+if "memory_report" not in st.session_state:
+    st.session_state.memory_report = None
+
+if "score_job" not in st.session_state:
+    st.session_state.score_job = None
+
+if "eda_job" not in st.session_state:
+    st.session_state.eda_job = None
+
+if "appended_rows" not in st.session_state:
+    st.session_state.appended_rows = None
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+
+
+def tag_spans():
+    # every span recorded during this run carries the session and dataset
+    df = st.session_state.df if st.session_state.table is None else st.session_state.table
+    set_context(
+        session=st.session_state.session_id, dataset_hash=st.session_state.file_hash,
+        rows=None if df is None else df.shape[0], cols=None if df is None else df.shape[1]
+    )
+
+
+tag_spans()
+
+
+# --- Load settings ---
+with st.sidebar.expander("⚙️ Load Settings"):
+    engine = st.selectbox(
+        "Compute engine", available_engines(), format_func=COMPUTE_ENGINES.get,
+        help="DuckDB scans the uploaded file in place instead of loading it into memory: the score, "
+             "Quick Insights and chart aggregations run as queries over the file, while previews, "
+             f"point charts and EDA reports use a {SAMPLE_ROWS:,}-row sample"
+    )
+    in_memory = engine == "pandas"
+    compact_mode = st.checkbox(
+        "Compact load mode", value=False, disabled=not in_memory,
+        help="Downcast numeric columns and store low-cardinality text columns as categories"
+    ) and in_memory
+    arrow_strings = st.checkbox(
+        "Arrow-backed strings", value=False, disabled=not compact_mode,
+        help="Store remaining text columns as pyarrow strings"
+    )
+    append_mode = st.checkbox(
+        "Append to current dataset", value=False,
+        disabled=st.session_state.df is None or st.session_state.table is not None or not in_memory,
+        help="Add the next upload's rows to the loaded dataset (same columns). The quality score and "
+             "approximate statistics are updated from the new rows only."
+    )
+
 
 
 # --- File uploader ---
 uploaded_file = st.file_uploader(
-    "📂 Choose a CSV file",
-    type=["csv"],
+    "📂 Choose a CSV, Parquet or Feather file",
+    type=["csv", "parquet", "feather"],
     accept_multiple_files=False,
     key="file_upload"
 )
 
-if uploaded_file is not None and uploaded_file != st.session_state.uploaded_file:
+# an upload is loaded once per file and load settings, whether or not the
+# load succeeds, so reruns never parse a rejected file again while changing
+# a setting loads the file again with it
+load_attempt = (uploaded_file, engine, compact_mode, compact_mode and arrow_strings)
+if uploaded_file is not None and load_attempt != st.session_state.load_attempt:
+    st.session_state.load_attempt = load_attempt
     st.session_state.uploaded_file = uploaded_file
 
-    #progres bar
+    #progres bar driven by the bytes the parser has actually consumed
     progress_text = "⏳ Uploading and processing your file..."
     progress_bar = st.progress(0, text=progress_text)
+    last_percent = [0]
 
-    for perc in range(0, 101, 20):
-        time.sleep(0.2)
-        progress_bar.progress(perc, text=progress_text)
+    def update_progress(bytes_read, total_bytes):
+        percent = min(100, int(100 * bytes_read / max(1, total_bytes or 1)))
+        if percent > last_percent[0]:
+            last_percent[0] = percent
+            progress_bar.progress(percent, text=progress_text)
 
-    progress_bar.empty()
-    
-    st.toast("✅ File uploaded successfully!", icon="🎉")
+    # a file seen before is served from the registry, or memory-mapped from the
+    # columnar store, without re-parsing; compact frames get their own key since their dtypes (and Info output) differ
+    # appended chunks are keyed by the dataset they extend, and are not
+    # compacted: the dataset's dtypes decide the combined ones. Files loaded
+    # for DuckDB get their own key too, since their session frame is a sample
+    registry = get_registry()
+    set_context(session=st.session_state.session_id)
+    file_hash = chunk_hash = get_file_hash(uploaded_file)
+    base_hash, base_df = st.session_state.file_hash, st.session_state.df
+    appending = append_mode and base_df is not None and st.session_state.table is None
+    if not in_memory:
+        file_hash = f"{file_hash}-{engine}"
+    elif appending:
+        file_hash = appended_hash(base_hash, chunk_hash)
+    elif compact_mode:
+        file_hash = f"{file_hash}-compact{'-arrow' if arrow_strings else ''}"
+    set_context(session=st.session_state.session_id, dataset_hash=file_hash)
+    df = registry.get_frame(file_hash) if in_memory else None
+    history = registry.get_result(file_hash, "append_history") if appending else None
+    table = None
+
+    if not in_memory:
+        # the file is scanned where it lies; only a sample is held in memory
+        table = registry.get_result(file_hash, "engine_table")
+        status, message = True, "File is valid"
+        if table is None:
+            status, message, table = upload_table(uploaded_file, chunk_hash)
+            if status:
+                registry.put_result(file_hash, "engine_table", {}, table)
+        df = registry.cached(file_hash, "engine_sample", {"rows": SAMPLE_ROWS}, table.sample, SAMPLE_ROWS) \
+            if status else None
+        memory_report = None
+    elif df is not None and (history is not None or not appending):
+        status, message = True, "File is valid"
+        memory_report = registry.get_result(file_hash, "memory_report")
+    else:
+        validate = is_valid_columnar if is_columnar_file(uploaded_file) else is_valid_csv
+        # the upload was hashed above to look it up; it is not hashed again
+        status, message, df, _ = validate(uploaded_file, progress_callback=update_progress, file_hash=chunk_hash)
+        memory_report = None
+        if status and df is not None and appending:
+            # only the new rows are summarized; the combined frame stays in
+            # the registry, which spills it to the store if it is evicted
+            try:
+                file_hash, df, history = append_rows(base_hash, base_df, df, chunk_hash)
+            except ValueError as e:
+                status, message, df = False, str(e), None
+        elif status and df is not None:
+            if compact_mode:
+                df, memory_report = compact_dtypes(df, arrow_strings=arrow_strings)
+                registry.put_result(file_hash, "memory_report", {}, memory_report)
+            registry.put_frame(file_hash, df)
+            get_store().save(file_hash, df)
 
-    status, message, df = is_valid_csv(uploaded_file)
+    progress_bar.empty()
 
     if status and df is not None:
+        st.toast("✅ File uploaded successfully!", icon="🎉")
         st.session_state.df = df
+        st.session_state.table = table
+        st.session_state.memory_report = memory_report
+        st.session_state.file_hash = file_hash
         st.session_state.show_preview = True
         st.session_state.quality_score = None 
         st.session_state.quality_factors = None
+        st.session_state.score_job = None
+        st.session_state.appended_rows = None
+        tag_spans()
+        if appending:
+            # the history already holds everything the score needs
+            st.session_state.appended_rows = len(df) - len(base_df)
+            score_params = {"duplicate_mode": "fingerprint", "statistics": "approximate"}
+            score = registry.cached(file_hash, "quality_score", score_params, history.score, df)
+            st.session_state.quality_score, st.session_state.quality_factors = score
         
+    elif appending:
+        # a rejected chunk leaves the loaded dataset as it was
+        st.error(f"❌ {message}")
+
     else:
         st.session_state.df = None
+        st.session_state.table = None
+        st.session_state.file_hash = None
         st.session_state.show_preview = False
         st.error(f"❌ {message}")
 
 if st.session_state.df is not None:
+
+    with st.sidebar.expander("⚙️ Analysis Settings"):
+        duplicate_mode = st.selectbox(
+            "Duplicate detection", list(DUPLICATE_MODES),
+            format_func=DUPLICATE_MODES.get,
+            help="Fingerprints hash each row to 64 bits; the estimate uses a HyperLogLog sketch for very large files"
+        )
+        max_points = st.number_input(
+            "Max points per chart", min_value=500, max_value=200_000, value=MAX_POINTS, step=500,
+            help="Charts are aggregated or downsampled on the server to stay under this budget"
+        )
+        line_method = st.selectbox("Line downsampling", ["lttb", "minmax"],
+                                   format_func={"lttb": "LTTB", "minmax": "Min/max per bucket"}.get)
+        scatter_method = st.selectbox("Large scatter plots", ["density", "sample"],
+                                      format_func={"density": "Density grid", "sample": "Random sample"}.get)
+        # appended datasets keep sketch statistics up to date, so default to them
+        statistics = st.selectbox(
+            "Column statistics", list(STATISTICS_MODES), format_func=STATISTICS_MODES.get,
+            index=list(STATISTICS_MODES).index("approximate") if st.session_state.appended_rows else 0,
+            help="Approximate mode summarizes columns chunk by chunk with mergeable sketches "
+                 "(KLL quantiles, HyperLogLog, count-min) instead of sorting whole columns"
+        )
+        workers = st.number_input(
+            "Analysis workers", min_value=1, max_value=os.cpu_count() or 1, value=DEFAULT_WORKERS,
+            help="Column statistics of wide frames are computed in column groups on this many workers"
+        )
+        backend = st.selectbox("Parallel backend", list(PARALLEL_BACKENDS), format_func=PARALLEL_BACKENDS.get)
+
+    # with an out-of-core engine the session frame is a sample of the
+    # file, and anything computed over all rows goes through the table
+    table = st.session_state.table
+    dataset = st.session_state.df if table is None else table
     
     col1, col2 = st.columns([3, 1])
     
     with col1:
         st.info(f"**Filename:** {st.session_state.uploaded_file.name}")
-        st.write("**Shape:**", st.session_state.df.shape)
+        if st.session_state.appended_rows is not None:
+            st.caption(f"➕ {st.session_state.appended_rows:,} rows appended to the previous dataset")
+        st.write("**Shape:**", dataset.shape)
+        if table is not None:
+            st.caption(f"🦆 Scanned in place by DuckDB; previews, point charts and EDA use a "
+                       f"{len(st.session_state.df):,}-row sample")
+        if st.session_state.memory_report is not None:
+            report = st.session_state.memory_report
+            saved = report["bytes_saved"].sum()
+            with st.expander(f"🗜️ Compact mode saved {saved / 1024**2:.1f} MB "
+                             f"({saved / max(1, report['bytes_before'].sum()):.0%})"):
+                st.dataframe(report)
     
     with col2:
         if st.button("🧮 Data Quality Score", use_container_width=True, 
                     help="Calculate data quality assessment"):
-            with st.spinner("Analyzing data quality..."):
-                score, factors = calculate_score(st.session_state.df)
-                st.session_state.quality_score = score
-                st.session_state.quality_factors = factors
-            st.rerun()
+            score_params = {"duplicate_mode": duplicate_mode, "statistics": statistics}
+            cached_score = get_registry().get_result(st.session_state.file_hash, "quality_score", score_params)
+            if cached_score is not None:
+                st.session_state.quality_score, st.session_state.quality_factors = cached_score
+                st.rerun()
+            # the worker gets a copy of the column stats computed so far and
+            # sends back the completed set
+            job_id = get_runner().submit(
+                st.session_state.file_hash, "quality_score", score_params,
+                score_with_stats, stored_frame(st.session_state.file_hash, dataset),
+                duplicate_mode=duplicate_mode,
+                stats=get_column_stats(st.session_state.file_hash, statistics),
+                workers=workers, backend=backend
+            )
+            st.session_state.score_job = (job_id, score_params)
+
+    # the score is computed in a worker process; poll it until it finishes
+    if st.session_state.score_job:
+        job_id, score_params = st.session_state.score_job
+        status = poll_job(job_id, "Analyzing data quality")
+        if status["state"] == "done":
+            (score, factors), column_stats = get_runner().result(job_id)
+            get_column_stats(st.session_state.file_hash, score_params["statistics"]).update(column_stats)
+            get_registry().put_result(st.session_state.file_hash, "quality_score", score_params, (score, factors))
+            st.session_state.quality_score = score
+            st.session_state.quality_factors = factors
+            st.session_state.score_job = None
+        elif status["state"] in ("failed", "cancelled", "unknown"):
+            if status["error"] is not None:
+                st.error(f"❌ Quality score failed: {status['error']}")
+            st.session_state.score_job = None
 
     #Display Quality score    
     if st.session_state.quality_score is not None:
@@ -92,7 +315,7 @@ if st.session_state.df is not None:
 
     if st.session_state.show_preview:
         st.write("**Data Preview**")
-        st.dataframe(st.session_state.df.head())
+        st.dataframe(dataset.head())
     
     st.sidebar.title("🛠️ Analysis Tools")
     nav_choice = st.sidebar.radio(
@@ -103,32 +326,70 @@ if st.session_state.df is not None:
     #Quick insights
     if nav_choice == "📊 Quick Insights":
         st.header("📊 Quick Insights")
-        display_insights()
+        display_insights(statistics, workers, backend, table)
 
     #Auto EDA
     elif nav_choice == "🔎 Auto Generate EDA":
         st.header("🔎 Auto Generate EDA")   
         st.write("This feature uses **ydata_profiling** to create a complete exploratory data analysis (EDA) report.")
+        if table is not None:
+            st.caption(f"Reports profile the {len(st.session_state.df):,}-row sample of the file.")
+
+        df = st.session_state.df
+        eda_mode = st.radio("Profile mode:", list(EDA_MODES), format_func=EDA_MODES.get)
+        row_budget, stratify_by = None, None
+        if eda_mode != "full":
+            row_budget = st.number_input(
+                "Row budget", min_value=1_000, value=DEFAULT_ROW_BUDGET, step=10_000,
+                help="Rows are sampled down to this budget before profiling"
+            )
+            strata = get_registry().cached(
+                st.session_state.file_hash, "strata_columns", {}, stratification_columns, df,
+                stats=get_column_stats(st.session_state.file_hash), source=dataset
+            )
+            stratify_by = st.selectbox("Stratify sample by:", ["None"] + strata)
+            stratify_by = None if stratify_by == "None" else stratify_by
 
-        if st.button("Generate Auto EDA"):
-            with st.spinner("Generating EDA Report... Please wait ⏳"):
-                report_path = "eda_report.html"
-                generate_eda(st.session_state.df, report_path)
+        settings = eda_settings(eda_mode, row_budget, stratify_by)
+        report_path = eda_report_path(st.session_state.file_hash, settings)
 
-            st.toast("✅ Auto EDA Report Generated!")
+        if st.button("Generate Auto EDA") and not os.path.exists(report_path):
+            st.session_state.eda_job = get_runner().submit(
+                st.session_state.file_hash, "eda_report", settings,
+                generate_eda, stored_frame(st.session_state.file_hash, df), report_path, **settings
+            )
 
-            with open(report_path, "r", encoding="utf-8") as f:
-                st.session_state.eda_html = f.read()
+        if st.session_state.eda_job:
+            status = poll_job(st.session_state.eda_job, "Generating EDA Report")
+            if status["state"] == "done":
+                st.toast("✅ Auto EDA Report Generated!")
+                st.session_state.eda_job = None
+            elif status["state"] in ("failed", "cancelled", "unknown"):
+                if status["error"] is not None:
+                    st.error(f"❌ EDA report failed: {status['error']}")
+                st.session_state.eda_job = None
 
-        if "eda_html" in st.session_state:
-            st.components.v1.html(st.session_state.eda_html, height=800, scrolling=True)
-            with open("eda_report.html", "rb") as f:
-                st.download_button(
-                    label="Download EDA Report", data=f,
-                    file_name="eda_report.html", mime="text/html"
-                )
+        # reports are cached on disk per dataset and settings, so coming back
+        # to this tab shows the existing report instead of regenerating it.
+        # The browser loads the chosen section straight from disk; only its
+        # path goes through the session.
+        if os.path.exists(report_path):
+            sections = dict(report_sections(report_path))
+            section = st.radio("Report section:", list(sections), horizontal=True)
+            get_artifact_store().viewer(sections[section], height=800, key="eda_report")
 
     #Columns Visualization
     elif nav_choice == "📈 Column Visualizations":
         st.header("📈 Column Visualizations")
-        visualize_columns(st.session_state.df)
\ No newline at end of file
+        visualize_columns(st.session_state.df, max_points, line_method, scatter_method, statistics, table)
+
+if st.sidebar.checkbox("Show performance panel", value=False,
+                       help="Timings, memory growth and cache hits of the instrumented operations"):
+    performance_panel()
+
+# the page is on screen: import the heavy backends (profiling, plotting)
+# in the background so the first EDA report or chart does not wait on them
+if st.runtime.exists():
+    warm_up()
+
+rerun_while_polling()
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, util
+
+import numpy as np
+import pandas as pd
+
+PARALLEL_BACKENDS = {
+    "thread": "Threads",
+    "process": "Processes (shared memory)",
+}
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+MIN_GROUP_CELLS = 500_000     # smaller column groups are not worth a worker
+
+
+def column_groups(df, columns, workers):
+    # Contiguous groups of roughly equal size, at most one per worker. The
+    # grouping only depends on the frame's shape, never on timing.
+    columns = list(columns)
+    by_size = max(1, len(df) * len(columns) // MIN_GROUP_CELLS)
+    n_groups = max(1, min(workers, len(columns), by_size))
+    bounds = np.linspace(0, len(columns), n_groups + 1).round().astype(int)
+    return [columns[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class SharedFrame:
+    # A frame whose plain numpy columns are copied once into a shared memory
+    # block. Pickling sends only the block's name and layout, and workers
+    # rebuild their columns on views of the block instead of unpickling
+    # copies of the data. Object and extension columns are not shared: each
+    # task is sent only those of its own group (see part).
+    def __init__(self, df):
+        shared = [col for col in df.columns
+                  if isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in "biuf"]
+        self.length = len(df)
+        self.layout = []              # (column, dtype, byte offset)
+        offset = 0
+        for col in shared:
+            self.layout.append((col, df[col].dtype.str, offset))
+            offset += df[col].dtype.itemsize * self.length
+        self._others = df[[col for col in df.columns if col not in set(shared)]].reset_index(drop=True)
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        self.name = self._memory.name
+        for col, dtype, start in self.layout:
+            view = np.ndarray(self.length, dtype=dtype, buffer=self._memory.buf, offset=start)
+            view[:] = df[col].to_numpy()
+            del view
+
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if key not in ("_memory", "_others")}
+
+    def part(self, columns):
+        # the columns' unshared values, to be sent along with this frame to
+        # the task that attaches them
+        return self._others[[col for col in columns if col in self._others.columns]]
+
+    def attach(self, columns, others):
+        # (frame of the columns, handle); close the handle once the frame is
+        # released. others is part(columns).
+        memory = shared_memory.SharedMemory(name=self.name)
+        data = {col: np.ndarray(self.length, dtype=dtype, buffer=memory.buf, offset=start)
+                for col, dtype, start in self.layout if col in set(columns)}
+        data.update({col: others[col] for col in others.columns})
+        return pd.DataFrame(data, copy=False)[list(columns)], memory
+
+    def release(self):
+        self._memory.close()
+        self._memory.unlink()
+
+
+def _run_group(fn, shared, group, others, kwargs):
+    frame, memory = shared.attach(group, others)
+    try:
+        return fn(frame, group, **kwargs)
+    finally:
+        del frame
+        try:
+            memory.close()
+        except BufferError:
+            # a result still references the block; it is unmapped when the
+            # worker exits
+            pass
+
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    # One spawn pool per process, shared by every call, so workers import
+    # pandas once rather than once per call. It grows when a call asks for
+    # more workers than it has. A process exiting through multiprocessing
+    # (e.g. a job worker) joins its children first, so the pool is shut down
+    # by a finalizer that runs before that and before the pool's own queues
+    # are closed (their finalizers have priority 10).
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = workers
+            util.Finalize(_pool, _pool.shutdown, exitpriority=100)
+        return _pool
+
+
+def _discard_pool(pool):
+    # a pool whose worker died cannot run anything else
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def map_column_groups(fn, df, columns, workers=1, backend="thread", **kwargs):
+    # Runs fn(frame, group_columns, **kwargs) -> {column: result} over column
+    # groups and merges the results in column order. fn must treat columns
+    # independently, so the merged result is identical to a serial call.
+    if backend not in PARALLEL_BACKENDS:
+        raise ValueError(f"Unknown parallel backend: {backend}")
+    columns = list(columns)
+    groups = column_groups(df, columns, workers)
+    if len(groups) <= 1:
+        return fn(df, columns, **kwargs)
+
+    if backend == "process":
+        shared = SharedFrame(df[columns])
+        pool = get_pool(len(groups))
+        try:
+            results = list(pool.map(_run_group, [fn] * len(groups), [shared] * len(groups), groups,
+                                    [shared.part(group) for group in groups], [kwargs] * len(groups)))
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        finally:
+            shared.release()
+    else:
+        # NumPy sorts, reductions and pandas hashing release the GIL for
+        # most of their work, so threads overlap on the numeric blocks
+        with ThreadPoolExecutor(len(groups)) as pool:
+            results = list(pool.map(lambda group: fn(df, group, **kwargs), groups))
+
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return {col: merged[col] for col in columns}
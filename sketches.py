@@ -0,0 +1,265 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def row_fingerprints(df):
+    # 64-bit hash per row, combined from vectorized per-column hashes
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def fingerprint_collision_bound(n):
+    # expected number of distinct row pairs sharing a 64-bit fingerprint
+    return n * (n - 1) / 2 / 2.0**64
+
+
+class FingerprintSet:
+    # Sorted distinct row fingerprints. Adding a block of rows sorts only the
+    # block and merges it in, so a dataset growing by appends keeps an exact
+    # (up to fingerprint collisions) distinct row count at 8 bytes per row.
+    def __init__(self, values=None):
+        self.values = np.unique(np.asarray(values, dtype=np.uint64)) if values is not None \
+            else np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.values.nbytes
+
+    def union(self, fingerprints):
+        # new set holding both; this one is left unchanged
+        new = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        positions = np.searchsorted(self.values, new)
+        known = positions < len(self.values)
+        known[known] = self.values[positions[known]] == new[known]
+        merged = FingerprintSet()
+        merged.values = np.insert(self.values, positions[~known], new[~known])
+        return merged
+
+
+def _leading_zeros(values):
+    # Count of leading zero bits of each uint64, from the float exponent of
+    # each 32-bit half (exactly representable, so frexp never rounds up)
+    _, high = np.frexp((values >> np.uint64(32)).astype(np.float64))
+    _, low = np.frexp((values & np.uint64(0xFFFFFFFF)).astype(np.float64))
+    return np.where(high > 0, 32 - high, 64 - low).astype(np.uint8)
+
+
+class HyperLogLog:
+    # Distinct-count sketch over 64-bit hashes. Registers merge with an
+    # element-wise max, so sketches built per chunk or per worker combine into
+    # the sketch of the whole input.
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return self
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        rank = np.minimum(_leading_zeros(hashes << p), 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * math.log(m / empty)
+        return float(estimate)
+
+
+class KLLSketch:
+    # Quantile sketch (Karnin, Lang & Liberty, 2016). Values sit in levels of
+    # compactors where an item at level h stands for 2**h inputs; a full level
+    # is sorted and every other item promoted. Levels merge by concatenation,
+    # so sketches of chunks or workers combine into the sketch of the whole.
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self):
+        # normalized rank error of a single quantile at 99% confidence
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            paired = len(items) - len(items) % 2
+            promoted = items[self._rng.integers(2):paired:2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = items[paired:]
+            # capacities shrink when a level is added, so start over
+            level = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.count += len(values)
+            self.minimum = min(self.minimum, values.min())
+            self.maximum = max(self.maximum, values.max())
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        qs = np.asarray(qs, dtype=np.float64)
+        if not self.count:
+            return np.full(qs.shape, np.nan)
+        items, cumulative = self._weighted()
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        result = items[np.minimum(positions, len(items) - 1)]
+        result[qs <= 0] = self.minimum
+        result[qs >= 1] = self.maximum
+        return result
+
+    def rank(self, value, inclusive=True):
+        # estimated fraction of inputs <= value (< value if not inclusive)
+        if not self.count:
+            return np.nan
+        items, cumulative = self._weighted()
+        position = np.searchsorted(items, value, side="right" if inclusive else "left")
+        return cumulative[position - 1] / cumulative[-1] if position else 0.0
+
+
+_COUNT_MIN_SEEDS = np.array([
+    0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+    0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53,
+], dtype=np.uint64)
+
+
+class CountMinSketch:
+    # Frequency sketch over 64-bit hashes (Cormode & Muthukrishnan, 2005).
+    # Estimates never undercount; each overcounts by at most
+    # error_bound with probability 1 - exp(-depth). Tables merge by addition.
+    def __init__(self, width=2048, depth=4):
+        if depth > len(_COUNT_MIN_SEEDS):
+            raise ValueError(f"CountMinSketch supports at most {len(_COUNT_MIN_SEEDS)} rows")
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    @property
+    def error_bound(self):
+        return math.e / self.table.shape[1] * self.total
+
+    def _columns(self, hashes):
+        depth, width = self.table.shape
+        mixed = np.asarray(hashes, dtype=np.uint64)[None, :] * _COUNT_MIN_SEEDS[:depth, None]
+        return ((mixed >> np.uint64(32)) % np.uint64(width)).astype(np.intp)
+
+    def add_hashes(self, hashes, counts=None):
+        counts = np.ones(len(hashes), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        width = self.table.shape[1]
+        for row, columns in enumerate(self._columns(hashes)):
+            self.table[row] += np.bincount(columns, weights=counts, minlength=width).astype(np.int64)
+        self.total += int(counts.sum())
+        return self
+
+    def estimate(self, hashes):
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.table.shape[0])[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        if other.table.shape != self.table.shape:
+            raise ValueError("Cannot merge CountMinSketch tables of different shapes")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class TopValues:
+    # Approximate most frequent values: a count-min sketch holds the counts
+    # and a bounded candidate set remembers which values may be heavy. Each
+    # chunk offers its locally frequent values as candidates.
+    def __init__(self, capacity=64, width=2048, depth=4):
+        self.capacity = capacity
+        self.counts = CountMinSketch(width, depth)
+        self.candidates = {}          # hash -> value
+
+    @property
+    def error_bound(self):
+        return self.counts.error_bound
+
+    def _prune(self):
+        if len(self.candidates) > self.capacity:
+            hashes = np.fromiter(self.candidates, dtype=np.uint64, count=len(self.candidates))
+            keep = hashes[np.argsort(-self.counts.estimate(hashes), kind="stable")[:self.capacity]]
+            self.candidates = {int(h): self.candidates[int(h)] for h in keep}
+
+    def update(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        if not len(uniques):
+            return self
+        hashes = pd.util.hash_pandas_object(pd.Series(uniques), index=False).to_numpy()
+        self.counts.add_hashes(hashes, counts)
+        for i in np.argsort(-counts, kind="stable")[:self.capacity]:
+            self.candidates.setdefault(int(hashes[i]), uniques[i])
+        self._prune()
+        return self
+
+    def merge(self, other):
+        self.counts.merge(other.counts)
+        for h, value in other.candidates.items():
+            self.candidates.setdefault(h, value)
+        self._prune()
+        return self
+
+    def top(self, n):
+        # [(value, estimated count)] by decreasing estimate
+        if not self.candidates:
+            return []
+        hashes = np.fromiter(self.candidates, dtype=np.uint64, count=len(self.candidates))
+        estimates = self.counts.estimate(hashes)
+        order = np.argsort(-estimates, kind="stable")[:n]
+        return [(self.candidates[int(hashes[i])], int(estimates[i])) for i in order]
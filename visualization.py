@@ -1,21 +1,178 @@
-import streamlit as st
-import plotly.express as px
 import pandas as pd
 import numpy as np
 
+import chart_data
+import correlation
+from chart_data import MAX_POINTS
+from column_stats import get_column_stats, select_columns
+from dataset_cache import DatasetRegistry, get_registry
+from instrumentation import instrumented, span
+from lazy_imports import LazyModule
+
+# plotly is imported on the first chart, not at startup
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
+
+FIGURE_CACHE_BYTES = 256 * 1024**2
+
+# figures shared by every chart block and session, keyed by dataset hash,
+# chart type, columns and reduction settings
+_figure_cache = DatasetRegistry(max_bytes=FIGURE_CACHE_BYTES, name="figures")
+
 
 def initialize_session_state():
+    import streamlit as st
+
     if 'chart_blocks' not in st.session_state:
         st.session_state.chart_blocks = [0]
     if 'next_block_id' not in st.session_state:
         st.session_state.next_block_id = 1
     if 'chart_config' not in st.session_state:
         st.session_state.chart_config = {}
-    if 'saved_charts' not in st.session_state:
-        st.session_state.saved_charts = {}
 
 
-def render_charts(block_id, df):
+def _bar_of_counts(counts, title, column, count_label):
+    return px.bar(
+        x=counts.index, y=counts.values,
+        title=title, labels={'x': column, 'y': count_label}
+    )
+
+
+def _category_counts(series, n, statistics, stats, table=None):
+    # (counts, title note): sketched counts in approximate mode, with their
+    # count-min error bound, otherwise exact value counts, from the table's
+    # engine when there is one
+    if statistics == "approximate" and stats is not None and stats.top_values is not None:
+        bound = stats.top_values.error_bound
+        return stats.top_counts(n, series.name), f" (≈ counts, at most +{bound:,.0f} with 98% confidence)"
+    if table is not None:
+        return chart_data.truncate_counts(table.value_counts(series.name), n), ""
+    return chart_data.top_n_counts(series, n), ""
+
+
+@instrumented("build_figure", tags=("chart", "column", "second_column"))
+def build_figure(df, chart, column, second_column=None, max_points=MAX_POINTS,
+                 line_method="lttb", scatter_method="density", statistics="exact", stats=None, table=None):
+    # Every chart is reduced server side so that at most max_points data
+    # points (or bins/categories) are serialized to the browser. stats is the
+    # column's ColumnStats, whose range and quartiles are reused when given;
+    # approximate statistics also supply sketched category counts. table is
+    # the dataset in an out-of-core engine (compute_engine.DuckDBTable),
+    # which then computes category counts and histogram bins over the file.
+    fig = None
+    series = df[column]
+    is_numeric = pd.api.types.is_numeric_dtype(series)
+    # the stored summary covers all non-null values; charts drop infinities,
+    # so it only stands in for the chart's own pass when everything is finite
+    finite_stats = (
+        stats if stats is not None and stats.numeric and stats.count
+        and np.isfinite(stats.minimum) and np.isfinite(stats.maximum) else None
+    )
+
+    if chart == 'Bar Graph':
+        counts, note = _category_counts(series, chart_data.MAX_CATEGORIES, statistics, stats, table)
+        fig = _bar_of_counts(counts, f"Bar Chart of {column}{note}", column, 'Count')
+    elif chart == 'Pie Chart':
+        counts, note = _category_counts(series, chart_data.PIE_TOP_N, statistics, stats, table)
+        fig = px.pie(names=counts.index.astype(str), values=counts.values, title=f"Pie Chart of {column}{note}")
+    elif chart == 'Line Chart':
+        x, y = chart_data.line_points(series, max_points, line_method)
+        fig = px.line(x=x, y=y, title=f"Line Chart of {column}", labels={'x': 'index', 'y': column})
+    elif chart == 'Count Plot':
+        counts, note = _category_counts(series, chart_data.MAX_CATEGORIES, statistics, stats, table)
+        fig = _bar_of_counts(counts, f"Count Plot of {column}{note}", column, 'Frequency')
+    elif chart == 'Histogram':
+        if is_numeric:
+            value_range = (finite_stats.minimum, finite_stats.maximum) if finite_stats else None
+            if table is not None:
+                lefts, widths, counts = table.histogram_bins(column, chart_data.HISTOGRAM_BINS, value_range)
+            else:
+                lefts, widths, counts = chart_data.histogram_bins(series, value_range=value_range)
+            fig = go.Figure(go.Bar(x=lefts + widths / 2, y=counts, width=widths, name=column))
+            fig.update_layout(title=f"Histogram of {column}", xaxis_title=column, yaxis_title="count", bargap=0)
+        else:
+            counts, _ = _category_counts(series, chart_data.MAX_CATEGORIES, "exact", None, table)
+            fig = _bar_of_counts(counts, f"Histogram of {column}", column, 'count')
+    elif chart == 'Box Plot':
+        if not is_numeric:
+            raise ValueError("Box plots need a numerical column")
+        if finite_stats:
+            quartiles = [finite_stats.quantiles[q] for q in (0.25, 0.5, 0.75)]
+            box = chart_data.box_stats(series, max_points, quartiles, finite_stats.mean)
+        else:
+            box = chart_data.box_stats(series, max_points)
+        fig = go.Figure()
+        if box is not None:
+            fig.add_trace(go.Box(
+                x=[column], q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]],
+                lowerfence=[box["lowerfence"]], upperfence=[box["upperfence"]],
+                mean=[box["mean"]], boxpoints=False, name=column
+            ))
+            fig.add_trace(go.Scatter(
+                x=[column] * len(box["outliers"]), y=box["outliers"],
+                mode="markers", name="outliers", marker=dict(size=4)
+            ))
+        note = f" (≈ quartiles, ±{finite_stats.sketch.rank_error:.1%} rank)" if finite_stats and finite_stats.approximate else ""
+        fig.update_layout(title=f"Box Plot of {column}{note}", yaxis_title=column)
+    elif chart == 'Scatter Plot':
+        both_numeric = is_numeric and pd.api.types.is_numeric_dtype(df[second_column])
+        title = f"Scatter Plot: {column} vs {second_column}"
+        if len(df) > max_points and both_numeric and scatter_method == "density":
+            x, y, counts = chart_data.density_grid(series, df[second_column])
+            fig = go.Figure(go.Heatmap(x=x, y=y, z=counts, colorscale="Viridis", colorbar=dict(title="rows")))
+            fig.update_layout(title=title, xaxis_title=column, yaxis_title=second_column)
+        else:
+            sample = chart_data.sample_rows(df[[column, second_column]], max_points)
+            fig = px.scatter(sample, x=column, y=second_column, title=title)
+    elif chart == "Correlation Heatmap":
+        if is_numeric and pd.api.types.is_numeric_dtype(df[second_column]):
+            coefficient = series.corr(df[second_column])
+            sample = chart_data.sample_rows(df[[column, second_column]], max_points)
+            fig = px.scatter(sample, x=column, y=second_column)
+            line = chart_data.trend_line(sample[column], sample[second_column])
+            if line is not None:
+                fig.add_trace(go.Scatter(x=line[0], y=line[1], mode="lines", name="trend"))
+            fig.add_annotation(
+                x=0.05, y=0.95,
+                xref="paper", yref="paper",
+                text=f"Correlation: {coefficient:.3f}",
+                showarrow=False,
+                bgcolor="white",
+                bordercolor="black",
+                borderwidth=1
+            )
+        else:
+            raise ValueError("Both columns must be numerical for correlation analysis")
+
+    if fig:
+        fig.update_layout(
+            height=400,
+            showlegend=chart in ['Pie Chart', 'Scatter Plot'],
+            margin=dict(l=20, r=20, t=40, b=20)
+        )
+    return fig
+
+
+def get_figure(df, dataset_hash, chart, column, second_column=None, table=None, **options):
+    # with a table, df is a sample of it; datasets loaded for an engine
+    # have their own hash, so the cache key leaves the table out
+    if dataset_hash is None:
+        return build_figure(df, chart, column, second_column, table=table, **options)
+    params = {"column": column, "second_column": second_column, **options}
+    statistics = options.get("statistics", "exact")
+    if chart in ('Histogram', 'Box Plot') and pd.api.types.is_numeric_dtype(df[column]) or \
+            chart in ('Bar Graph', 'Pie Chart', 'Count Plot') and statistics == "approximate":
+        source = table if table is not None else df
+        options["stats"] = get_column_stats(dataset_hash, statistics).get(source, [column])[column]
+    return _figure_cache.cached(
+        dataset_hash, chart, params, build_figure, df, chart, column, second_column, table=table, **options
+    )
+
+
+def render_charts(block_id, df, max_points=MAX_POINTS, line_method="lttb", scatter_method="density",
+                  statistics="exact", table=None):
+    import streamlit as st
+
     col1, col2, col3 = st.columns([4, 4, 1])
     column_options = ['None'] + df.columns.tolist()
     chart_options = [
@@ -40,7 +197,6 @@ def render_charts(block_id, df):
     if col3.button("❌", key=f"remove_{block_id}"):
         st.session_state.chart_blocks.remove(block_id)
         st.session_state.chart_config.pop(block_id, None)
-        st.session_state.saved_charts.pop(block_id, None)
         st.rerun()
 
     if selected_column != 'None' and selected_chart != 'None':
@@ -55,76 +211,36 @@ def render_charts(block_id, df):
             selected_chart, selected_column, second_column
         )
 
+    # always re-display the configured chart; figures come from the shared
+    # cache, so only the config tuple lives in session state
+    if block_id in st.session_state.chart_config:
+        chart_type, col1_name, col2_name = st.session_state.chart_config[block_id]
         try:
-            fig = None
-            if selected_chart == 'Bar Graph':
-                value_counts = df[selected_column].value_counts()
-                fig = px.bar(
-                    x=value_counts.index, y=value_counts.values,
-                    title=f"Bar Chart of {selected_column}",
-                    labels={'x': selected_column, 'y': 'Count'}
-                )
-            elif selected_chart == 'Pie Chart':
-                fig = px.pie(df, names=selected_column, title=f"Pie Chart of {selected_column}")
-            elif selected_chart == 'Line Chart':
-                fig = px.line(df, y=selected_column, title=f"Line Chart of {selected_column}")
-            elif selected_chart == 'Count Plot':
-                value_counts = df[selected_column].value_counts()
-                fig = px.bar(
-                    x=value_counts.index, y=value_counts.values,
-                    title=f"Count Plot of {selected_column}",
-                    labels={'x': selected_column, 'y': 'Frequency'}
-                )
-            elif selected_chart == 'Histogram':
-                fig = px.histogram(df, x=selected_column, nbins=20, title=f"Histogram of {selected_column}")
-            elif selected_chart == 'Box Plot':
-                fig = px.box(df, y=selected_column, title=f"Box Plot of {selected_column}")
-            elif selected_chart == 'Scatter Plot':
-                fig = px.scatter(
-                    df, x=selected_column, y=second_column,
-                    title=f"Scatter Plot: {selected_column} vs {second_column}"
-                )
-            elif selected_chart == "Correlation Heatmap":
-                if pd.api.types.is_numeric_dtype(df[selected_column]) and pd.api.types.is_numeric_dtype(df[second_column]):
-                    correlation = df[selected_column].corr(df[second_column])
-                    fig = px.scatter(df, x=selected_column, y=second_column, trendline='ols')
-                    fig.add_annotation(
-                        x=0.05, y=0.95,
-                        xref="paper", yref="paper",
-                        text=f"Correlation: {correlation:.3f}",
-                        showarrow=False,
-                        bgcolor="white",
-                        bordercolor="black",
-                        borderwidth=1
-                    )
-                else:
-                    st.error("Both columns must be numerical for correlation analysis")
-                    return
-
-            if fig:
-                fig.update_layout(
-                    height=400,
-                    showlegend=selected_chart in ['Pie Chart', 'Scatter Plot'],
-                    margin=dict(l=20, r=20, t=40, b=20)
-                )
-                # save chart persistently
-                st.session_state.saved_charts[block_id] = fig
+            fig = get_figure(
+                df, st.session_state.get("file_hash"), chart_type, col1_name, col2_name,
+                max_points=max_points, line_method=line_method, scatter_method=scatter_method,
+                statistics=statistics, table=table
+            )
+
+        except ValueError as e:
+            st.error(str(e))
+            return
 
         except Exception as e:
-            st.error(f"❌ Failed to render {selected_chart} for {selected_column}: {e}")
-
-    # always re-display saved chart if available
-    if block_id in st.session_state.saved_charts:
-        chart_type, col1_name, col2_name = st.session_state.chart_config.get(block_id, ("", "", ""))
-        unique_key = f"chart_{block_id}_{chart_type}_{col1_name}_{col2_name or ''}"
-        st.plotly_chart(
-            st.session_state.saved_charts[block_id],
-            use_container_width=True,
-            key=unique_key
-        )
+            st.error(f"❌ Failed to render {chart_type} for {col1_name}: {e}")
+            return
 
+        if fig:
+            unique_key = f"chart_{block_id}_{chart_type}_{col1_name}_{col2_name or ''}"
+            # serializing the figure to the browser is timed on its own
+            with span("plotly_chart", chart=chart_type, column=col1_name):
+                st.plotly_chart(fig, use_container_width=True, key=unique_key)
+
+
+def visualize_columns(df, max_points=MAX_POINTS, line_method="lttb", scatter_method="density",
+                      statistics="exact", table=None):
+    import streamlit as st
 
-def visualize_columns(df):
     if df is None or df.empty:
         st.warning("No data available for visualization!")
         return
@@ -134,7 +250,7 @@ def visualize_columns(df):
 
     # render all chart blocks
     for block_id in st.session_state.chart_blocks:
-        render_charts(block_id, df)
+        render_charts(block_id, df, max_points, line_method, scatter_method, statistics, table)
         st.markdown('---')
 
     if st.button("➕ Add Chart"):
@@ -143,20 +259,69 @@ def visualize_columns(df):
         st.rerun()
 
     st.markdown("---")
+    if st.checkbox("Show correlation matrix", key="show_corr_matrix"):
+        show_full_correlation_matrix(df, st.session_state.get("file_hash"))
 
 
-def show_full_correlation_matrix(df):
-    numerical_df = df.select_dtypes(include=[np.number])
-    if len(numerical_df.columns) > 1:
-        st.subheader("📊 Complete Correlation Matrix")
-        corr_matrix = numerical_df.corr()
-        fig = px.imshow(
-            corr_matrix,
-            text_auto=True,
-            aspect="auto",
-            color_continuous_scale='RdBu_r',
-            title='Correlation Matrix Heatmap'
+def build_correlation_figure(corr, pairs, min_abs=0.0):
+    # the clustered (and for wide frames, cut down) matrix; values are
+    # printed in the cells only while they stay readable
+    view = correlation.matrix_view(corr, pairs, min_abs)
+    title = "Correlation Matrix (clustered)"
+    if len(view) < len(corr):
+        title += f", {len(view)} of {len(corr)} columns"
+    fig = px.imshow(
+        view,
+        text_auto=".2f" if len(view) <= correlation.ANNOTATE_COLUMNS else False,
+        aspect="auto",
+        zmin=-1, zmax=1,
+        color_continuous_scale='RdBu_r',
+        title=title
+    )
+    fig.update_layout(height=max(400, 16 * len(view)), margin=dict(l=20, r=20, t=40, b=20))
+    return fig
+
+
+def show_full_correlation_matrix(df, dataset_hash=None):
+    # The correlations of every numeric column pair, ranked, and a heatmap
+    # of the strongest ones. The matrix is cached per dataset and sample;
+    # the threshold only changes what is shown.
+    import streamlit as st
+
+    columns = select_columns(df, [np.number])
+    if len(columns) < 2:
+        st.info("Need at least two numerical columns for correlation matrix.")
+        return
+
+    st.subheader("📊 Complete Correlation Matrix")
+    col1, col2 = st.columns(2)
+    max_rows = col1.number_input(
+        "Row sample", min_value=0, value=correlation.DEFAULT_SAMPLE_ROWS, step=10_000,
+        help="Rows are sampled down to this many before correlating; 0 uses every row"
+    )
+    min_abs = col2.slider("Hide correlations below |r|", 0.0, 1.0,
+                          0.0 if len(columns) <= correlation.MAX_MATRIX_COLUMNS else 0.3, 0.05)
+
+    params = {"max_rows": max_rows}
+    if dataset_hash is None:
+        corr = correlation.correlation_matrix(df, columns, max_rows)
+    else:
+        corr = get_registry().cached(
+            dataset_hash, "correlation_matrix", params, correlation.correlation_matrix, df, columns, max_rows
         )
-        st.plotly_chart(fig, use_container_width=True, key="corr_matrix")
+    pairs = correlation.top_pairs(corr, correlation.TOP_PAIRS, min_abs)
+    if pairs.empty:
+        st.info(f"No column pairs correlate with |r| ≥ {min_abs:.2f}.")
+        return
+
+    if dataset_hash is None:
+        fig = build_correlation_figure(corr, pairs, min_abs)
     else:
-        st.info("Need at least two numerical columns for correlation matrix.")
+        fig = _figure_cache.cached(
+            dataset_hash, "correlation_matrix", {**params, "min_abs": min_abs},
+            build_correlation_figure, corr, pairs, min_abs
+        )
+    with span("plotly_chart", chart="correlation_matrix"):
+        st.plotly_chart(fig, use_container_width=True, key="corr_matrix")
+    st.markdown("**Strongest correlations**")
+    st.dataframe(pairs, use_container_width=True, hide_index=True)